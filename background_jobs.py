@@ -0,0 +1,19 @@
+"""Shared worker pool for generation requests that run ahead of the page.
+
+Work submitted here runs off the script thread, so a follow-up request (the
+detailed itinerary) can start the moment its input exists instead of waiting
+for the page to render, and it keeps going if the run that started it is
+interrupted by a rerun. Sessions keep the returned Future in session_state
+and collect the result where it is displayed.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BACKGROUND_WORKERS = int(os.getenv("DATENIGHT_BACKGROUND_WORKERS", 8))
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="datenight-job")
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the shared pool and return its Future."""
+    return _executor.submit(fn, *args, **kwargs)
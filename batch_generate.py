@@ -0,0 +1,195 @@
+"""Headless batch generation of date plans over a grid of preferences.
+
+Every combination of city x theme x activity type becomes one job. Jobs run
+on a bounded thread pool behind a requests-per-minute limiter, which also
+sizes the app's rate-limiter lane for the model, and each result
+is appended to a JSONL file as soon as it finishes. Re-running with the same
+output file skips jobs that already succeeded, so an interrupted batch
+resumes where it stopped.
+
+    python batch_generate.py --cities "Austin,Chicago" --output plans.jsonl --rpm 30 --itinerary
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+# Before the app modules below read their DATENIGHT_* settings at import.
+load_dotenv()
+
+from date_planner import (
+    ACTIVITY_TYPES, PLANNING_STYLE_OPTIONS, PREP_TIME_OPTIONS, THEMES,
+    generate_date_plan_with_gemini, generate_detailed_itinerary,
+    location_prompt_line_for, planning_style_prompt_line_for,
+)
+from gemini_models import DEFAULT_MODEL
+from rate_limiter import rate_limiter
+
+
+class RequestsPerMinuteLimiter:
+    """Spaces request starts evenly so at most `rpm` begin in any minute."""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.interval
+        time.sleep(max(0.0, start_at - now))
+
+
+def job_id(job):
+    """Stable identifier of a job's inputs, used to resume."""
+    payload = json.dumps(job, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def build_jobs(args):
+    jobs = []
+    for city, theme, activity_type in itertools.product(args.cities, args.themes, args.activities):
+        jobs.append({
+            "city": city,
+            "theme": theme,
+            "activity_type": activity_type,
+            "budget_dollars": args.budget,
+            "prep_time": args.prep_time,
+            "time_budget_hours": args.duration,
+            "planning_style": args.planning_style,
+            "custom_input": args.custom_input,
+            "model": args.model,
+            "with_itinerary": args.itinerary,
+        })
+    return jobs
+
+
+def completed_job_ids(output_path):
+    """Ids of jobs already written successfully to the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut off by an interrupted run
+            if record.get("status") == "ok":
+                done.add(record.get("job_id"))
+    return done
+
+
+def run_job(job, api_key, limiter):
+    started = time.monotonic()
+    planning_style_prompt_line = planning_style_prompt_line_for(job["planning_style"])
+    location_prompt_line = location_prompt_line_for(bool(job["city"]), job["city"])
+    limiter.acquire()
+    plan = generate_date_plan_with_gemini(
+        api_key, job["model"],
+        job["theme"], job["activity_type"],
+        job["budget_dollars"], job["prep_time"], job["custom_input"],
+        job["time_budget_hours"],
+        planning_style_prompt_line,
+        location_prompt_line,
+    )
+    record = {"job_id": job_id(job), **job, "plan": plan, "itinerary": None}
+    if "error" not in plan and job["with_itinerary"]:
+        limiter.acquire()
+        record["itinerary"] = generate_detailed_itinerary(
+            api_key, job["model"], plan,
+            original_user_input=job["custom_input"],
+            location_prompt_line=location_prompt_line,
+            planning_style_prompt_line=planning_style_prompt_line,
+            city=job["city"],
+        )
+    # Incomplete results (salvaged from a cut-off response) are retried on the next run.
+    failed = any("error" in result or result.get("incomplete")
+                 for result in (plan, record["itinerary"]) if result is not None)
+    record["status"] = "error" if failed else "ok"
+    record["elapsed_s"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate date plans for every city x theme x activity combination.")
+    parser.add_argument("--cities", type=_csv, help="Comma-separated cities")
+    parser.add_argument("--cities-file", help="File with one city per line")
+    parser.add_argument("--themes", type=_csv, default=THEMES, help="Comma-separated themes (default: all)")
+    parser.add_argument("--activities", type=_csv, default=ACTIVITY_TYPES,
+                        help="Comma-separated activity types (default: all)")
+    parser.add_argument("--budget", type=int, default=50)
+    parser.add_argument("--prep-time", default="2 hours", choices=PREP_TIME_OPTIONS)
+    parser.add_argument("--duration", type=int, default=3, help="Activity duration in hours")
+    parser.add_argument("--planning-style", default=PLANNING_STYLE_OPTIONS[0], choices=PLANNING_STYLE_OPTIONS)
+    parser.add_argument("--custom-input", default="")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--itinerary", action="store_true", help="Also generate the detailed itinerary")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--rpm", type=float, default=30,
+                        help="Maximum requests started per minute; replaces the model's free-tier quota (0: no limit)")
+    parser.add_argument("--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("--api-key", default=None, help="Defaults to GOOGLE_API_KEY")
+    args = parser.parse_args(argv)
+    cities = list(args.cities or [])
+    if args.cities_file:
+        with open(args.cities_file, encoding="utf-8") as handle:
+            cities.extend(line.strip() for line in handle if line.strip())
+    args.cities = cities or [""]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    api_key = args.api_key or os.getenv("GOOGLE_API_KEY", "")
+    if not api_key:
+        print("No API key: pass --api-key or set GOOGLE_API_KEY.", file=sys.stderr)
+        return 2
+
+    jobs = build_jobs(args)
+    done = completed_job_ids(args.output)
+    pending = [job for job in jobs if job_id(job) not in done]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+
+    limiter = RequestsPerMinuteLimiter(args.rpm)
+    # The gateway's own lane would otherwise hold the batch to the free-tier
+    # quota and shed whatever does not fit in its queue.
+    if args.rpm > 0:
+        rate_limiter.set_quota(args.model, args.rpm)
+    else:
+        rate_limiter.scale = 0
+    failures = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, args.workers))
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            futures = [executor.submit(run_job, job, api_key, limiter) for job in pending]
+            for finished, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                failures += record["status"] != "ok"
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                print(f"[{finished}/{len(pending)}] {record['status']:5} {record['city'] or '-'} | "
+                      f"{record['theme']} | {record['activity_type']} ({record['elapsed_s']}s)", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run with the same --output to resume.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    executor.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
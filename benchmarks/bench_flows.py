@@ -0,0 +1,168 @@
+"""Offline benchmark of the app's generate, Surprise Me, itinerary and addition flows.
+
+Runs dateNight.py through Streamlit's AppTest harness with the Gemini SDK
+replaced by benchmarks/gemini_stub.py, so it needs no network or API key.
+For each flow it reports end-to-end latency of the interaction, the number of
+script runs it took (reruns included), the time spent inside the stubbed model
+and the remaining app overhead (script execution and rendering).
+
+    python benchmarks/bench_flows.py --iterations 5 --latency 0.3 --malformed-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep benchmark runs from reading or polluting the on-disk cache, call log, Surprise Me library and plan store.
+os.environ.setdefault("DATENIGHT_CACHE_DB", "")
+os.environ.setdefault("DATENIGHT_TELEMETRY_LOG", "")
+os.environ.setdefault("DATENIGHT_SURPRISE_LIBRARY", "")
+os.environ.setdefault("DATENIGHT_PLAN_STORE", "")
+# The stub has no quota; free-tier limits would turn the timings into queue waits.
+os.environ.setdefault("DATENIGHT_QUOTA_SCALE", "0")
+os.environ.setdefault("GOOGLE_API_KEY", "stub-key")
+
+import gemini_stub  # noqa: E402
+
+gemini_stub.install()
+
+import streamlit  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP_PATH = os.path.join(REPO_ROOT, "dateNight.py")
+
+
+class ScriptRunCounter:
+    """Counts script executions by wrapping st.set_page_config, which the app calls once per run."""
+
+    def __init__(self):
+        self.count = 0
+        self._original = streamlit.set_page_config
+
+    def __enter__(self):
+        def counting_set_page_config(*args, **kwargs):
+            self.count += 1
+            return self._original(*args, **kwargs)
+        streamlit.set_page_config = counting_set_page_config
+        return self
+
+    def __exit__(self, *exc_info):
+        streamlit.set_page_config = self._original
+
+
+def _button(app, label_prefix):
+    return next(button for button in app.button if button.label.startswith(label_prefix))
+
+
+def _fresh_app(timeout, sectioned_itinerary=False):
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    app.run()
+    app.checkbox(key="use_response_cache").uncheck().run()
+    if sectioned_itinerary:
+        app.checkbox(key="sectioned_itinerary").check().run()
+    return app
+
+
+def _measure(flow, interaction, app):
+    gemini_stub.config.reset_counters()
+    with ScriptRunCounter() as runs:
+        started = time.perf_counter()
+        interaction(app)
+        elapsed = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"{flow}: app raised {app.exception[0].message}")
+    return {
+        "flow": flow,
+        "end_to_end_s": elapsed,
+        "script_runs": runs.count,
+        "model_calls": gemini_stub.config.calls,
+        "model_s": gemini_stub.config.model_seconds,
+        # Concurrent calls (sectioned itineraries, hedges) overlap, so subtract their union, not their sum.
+        "model_wall_s": gemini_stub.config.model_wall_seconds,
+        "app_overhead_s": max(0.0, elapsed - gemini_stub.config.model_wall_seconds),
+    }
+
+
+def _generate(app):
+    _button(app, "✨ Generate").click().run()
+
+
+def _surprise(app):
+    _button(app, "🎁 Surprise Me").click().run()
+
+
+def _addition(app):
+    app.text_input(key="addition_input").input("add dessert")
+    _button(app, "🔄 Make Addition").click().run()
+
+
+def run_iteration(timeout, sectioned_itinerary=False):
+    results = []
+    app = _fresh_app(timeout, sectioned_itinerary)
+    # Generate includes the chained itinerary; report it separately from the plan's own runs.
+    results.append(_measure("generate+itinerary", _generate, app))
+    results.append(_measure("addition+itinerary", _addition, app))
+    results.append(_measure("rerun (idle)", lambda app: app.run(), app))
+    app = _fresh_app(timeout, sectioned_itinerary)
+    results.append(_measure("surprise_me", _surprise, app))
+    return results
+
+
+def summarize(results):
+    rows = []
+    for flow in dict.fromkeys(result["flow"] for result in results):
+        group = [result for result in results if result["flow"] == flow]
+        latencies = sorted(result["end_to_end_s"] for result in group)
+        rows.append({
+            "flow": flow,
+            "runs": len(group),
+            "e2e_p50_s": round(statistics.median(latencies), 3),
+            "e2e_max_s": round(latencies[-1], 3),
+            "script_runs": round(statistics.mean(result["script_runs"] for result in group), 2),
+            "model_calls": round(statistics.mean(result["model_calls"] for result in group), 2),
+            "app_overhead_s": round(statistics.median(result["app_overhead_s"] for result in group), 3),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub time to first chunk, seconds")
+    parser.add_argument("--chunk-size", type=int, default=40, help="Characters per streamed chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of responses to corrupt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="AppTest timeout per script run")
+    parser.add_argument("--sectioned-itinerary", action="store_true", help="Generate itineraries section by section")
+    parser.add_argument("--json", dest="json_path", help="Also write raw results to this file")
+    args = parser.parse_args(argv)
+
+    gemini_stub.config = gemini_stub.StubConfig(
+        latency=args.latency, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay,
+        malformed_rate=args.malformed_rate, seed=args.seed,
+    )
+    random.seed(args.seed)  # Surprise Me picks its example with the global random module
+    results = []
+    for _ in range(args.iterations):
+        results.extend(run_iteration(args.timeout, args.sectioned_itinerary))
+
+    rows = summarize(results)
+    columns = list(rows[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[column]):>18}" for column in columns))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"config": vars(args), "results": results, "summary": rows}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
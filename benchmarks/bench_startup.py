@@ -0,0 +1,153 @@
+"""Cold-start benchmark of dateNight.py, checked against a startup budget.
+
+Each sample starts a fresh interpreter. The first measures the app's imports
+with ``python -X importtime`` and lists the heaviest top-level packages. The
+second runs dateNight.py once through Streamlit's AppTest harness and times
+the first complete script run (time to first paint), from interpreter start.
+Both check that the Gemini SDK and api_core were not imported before the
+first model call, and the import run also checks that python-dotenv is not
+imported at module level. Exits non-zero when a median exceeds its budget or
+a deferred import was loaded.
+
+    python benchmarks/bench_startup.py --runs 5 --import-budget-ms 800 --paint-budget-s 3
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "dateNight.py")
+# Imports that must wait for the first model call.
+DEFERRED_MODULES = ("google.generativeai", "google.api_core", "grpc")
+# Imports that must not happen at module level (the app loads .env on its first run).
+DEFERRED_FROM_IMPORT = DEFERRED_MODULES + ("dotenv",)
+
+_FIRST_PAINT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=60)
+app.run()
+painted = time.perf_counter()
+print(json.dumps({{
+    "first_paint_s": painted - started,
+    "exception": [str(e.value) for e in app.exception],
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def _child_env():
+    # Keep startup runs from reading or polluting the on-disk caches and stores.
+    env = dict(os.environ)
+    for name in ("DATENIGHT_CACHE_DB", "DATENIGHT_TELEMETRY_LOG", "DATENIGHT_SURPRISE_LIBRARY", "DATENIGHT_PLAN_STORE"):
+        env.setdefault(name, "")
+    return env
+
+
+def app_imports():
+    """Top-level modules dateNight.py imports at module level."""
+    with open(APP_PATH, encoding="utf-8") as handle:
+        tree = ast.parse(handle.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def _deferred_loaded(modules, deferred=DEFERRED_MODULES):
+    return sorted(name for name in modules if name.startswith(deferred))
+
+
+def measure_imports(modules):
+    """Import times in ms (total, per top-level package) and the loaded module names.
+    Packages the interpreter and the snippet itself load are left out."""
+    baseline = _import_times(["json", "sys"])[0]
+    packages, loaded = _import_times(["json", "sys", *modules])
+    packages = {package: ms for package, ms in packages.items() if package not in baseline}
+    return sum(packages.values()), packages, loaded
+
+
+def _import_times(modules):
+    snippet = f"import {', '.join(modules)}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit() or name.startswith("  "):
+            continue  # header line, or a nested import already counted by its parent
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative_us) / 1000
+    return packages, json.loads(result.stdout)
+
+
+def measure_first_paint():
+    """Seconds from interpreter start to the end of the first script run, and the loaded modules."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _FIRST_PAINT_SNIPPET.format(app_path=APP_PATH)],
+        cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - started
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--import-budget-ms", type=float, default=800.0, help="Budget for the app's imports")
+    parser.add_argument("--paint-budget-s", type=float, default=3.0, help="Budget for time to first paint")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list")
+    parser.add_argument("--json", dest="json_path", help="Also write raw results to this file")
+    args = parser.parse_args(argv)
+
+    modules = app_imports()
+    import_totals, paint_times, exceptions = [], [], []
+    packages, deferred = {}, set()
+    for _ in range(max(1, args.runs)):
+        total_ms, run_packages, loaded = measure_imports(modules)
+        import_totals.append(total_ms)
+        for package, ms in run_packages.items():
+            packages.setdefault(package, []).append(ms)
+        deferred.update(_deferred_loaded(loaded, DEFERRED_FROM_IMPORT))
+        elapsed, report = measure_first_paint()
+        paint_times.append(elapsed)
+        exceptions.extend(report["exception"])
+        deferred.update(_deferred_loaded(report["modules"]))
+
+    import_ms = statistics.median(import_totals)
+    paint_s = statistics.median(paint_times)
+    heaviest = sorted(((statistics.median(times), package) for package, times in packages.items()), reverse=True)
+    print(f"app imports       {import_ms:8.1f} ms   (budget {args.import_budget_ms:.0f} ms)")
+    for ms, package in heaviest[:args.top]:
+        print(f"  {package:<16}{ms:8.1f} ms")
+    print(f"first paint       {paint_s:8.3f} s    (budget {args.paint_budget_s:.1f} s, from interpreter start)")
+    print(f"deferred imports  {', '.join(sorted(deferred)) or 'none loaded at startup'}")
+    if exceptions:
+        print(f"script errors     {exceptions[0]}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"import_ms": import_totals, "first_paint_s": paint_times, "deferred_loaded": sorted(deferred),
+                       "packages": packages, "exceptions": exceptions}, handle, indent=2)
+
+    over_budget = import_ms > args.import_budget_ms or paint_s > args.paint_budget_s
+    return 1 if over_budget or deferred or exceptions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
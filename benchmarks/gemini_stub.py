@@ -0,0 +1,225 @@
+"""Local stand-in for ``google.generativeai`` used by the benchmarks.
+
+``install()`` registers a fake SDK module under ``google.generativeai`` so the
+app runs without network access or the real package. Responses are canned
+plan / itinerary / itinerary-section / merge-patch JSON picked from the
+prompt, delivered after a configurable latency, split into chunks when
+streamed, and optionally corrupted at a configurable rate to exercise the
+repair path.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+SAMPLE_PLAN = {
+    "title": "Tacos, Tunes & Twilight",
+    "theme": "Fun 🎉",
+    "activity_type": "Out (Casual)🚶",
+    "budget_dollars": 60,
+    "prep_time": "2 hours",
+    "time_budget_hours": 4,
+    "planning_style": "Not specified",
+    "model_used": "stub",
+    "emoji_story": {"story": "😊🚗🌮🎸💃🌙✨🥰🏠💤", "description": "An easy evening of food, music and dancing."},
+    "plan_details": {
+        "step_1_title": "Food Truck Crawl",
+        "step_1_description": "Share three small plates from different trucks.",
+        "step_2_title": "Live Music",
+        "step_2_description": "Catch a local band at an outdoor stage.",
+        "food_drinks_suggestions": "Street tacos and agua fresca.",
+        "ambiance_extras_suggestions": "Bring a blanket for the lawn.",
+    },
+    "tips_and_considerations": ["Check the band schedule.", "Bring cash for the trucks."],
+}
+
+SAMPLE_TIMELINE_ITEM = {
+    "time": "6:00 PM",
+    "activity": "Food Truck Crawl",
+    "location": "Sample Food Park",
+    "address": "123 Main St, Austin, TX",
+    "details": "Start with tacos, then try the dessert truck.",
+    "booking_required": False,
+    "booking_link": "",
+    "cost_estimate": "$15 per person",
+    "duration": "1.5 hours",
+    "parking": "Free lot",
+    "tips": ["Arrive before the rush."],
+}
+
+SAMPLE_ITINERARY = {
+    "title": "Tacos, Tunes & Twilight - Detailed Itinerary",
+    "location_note": "",
+    "timeline": [dict(SAMPLE_TIMELINE_ITEM, time=f"{6 + hour}:00 PM") for hour in range(3)],
+    "backup_options": [{
+        "for_activity": "Live Music",
+        "alternative": "Sample Jazz Club",
+        "reason": "Indoor in case of rain",
+        "details": "Small cover charge.",
+    }],
+    "transportation_notes": "10 minute drive between venues.",
+    "total_estimated_cost": "$60 for two people",
+    "special_considerations": ["Evenings get cool; bring a jacket."],
+    "weather_contingency": "Move the music portion indoors.",
+}
+
+SKELETON_FIELDS = ("time", "activity", "location", "duration")
+SAMPLE_SKELETON = {
+    "title": SAMPLE_ITINERARY["title"],
+    "location_note": SAMPLE_ITINERARY["location_note"],
+    "timeline": [{field: item[field] for field in SKELETON_FIELDS} for item in SAMPLE_ITINERARY["timeline"]],
+}
+SAMPLE_SLOT_DETAILS = {field: value for field, value in SAMPLE_TIMELINE_ITEM.items() if field not in SKELETON_FIELDS}
+SAMPLE_BACKUPS = {"backup_options": SAMPLE_ITINERARY["backup_options"]}
+SAMPLE_LOGISTICS = {
+    field: SAMPLE_ITINERARY[field]
+    for field in ("transportation_notes", "total_estimated_cost", "special_considerations", "weather_contingency")
+}
+
+SAMPLE_PATCH = {
+    "plan_details": {"food_drinks_suggestions": "Street tacos, agua fresca and churros for dessert."},
+    "tips_and_considerations": ["Check the band schedule.", "Save room for churros."],
+}
+
+
+class StubConfig:
+    """Tunable behaviour shared by every stub model."""
+
+    def __init__(self, latency=0.5, chunk_size=40, chunk_delay=0.02, malformed_rate=0.0, seed=None):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.model_seconds = 0.0
+        self._intervals = []
+
+    def add_call(self, started, finished):
+        with self._lock:
+            self.calls += 1
+            self.model_seconds += finished - started
+            self._intervals.append((started, finished))
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = 0
+            self.model_seconds = 0.0
+            self._intervals = []
+
+    @property
+    def model_wall_seconds(self):
+        """Time during which at least one call was running; concurrent calls count once."""
+        with self._lock:
+            intervals = sorted(self._intervals)
+        total = 0.0
+        span_start = span_end = None
+        for started, finished in intervals:
+            if span_end is None or started > span_end:
+                if span_end is not None:
+                    total += span_end - span_start
+                span_start, span_end = started, finished
+            else:
+                span_end = max(span_end, finished)
+        if span_end is not None:
+            total += span_end - span_start
+        return total
+
+
+config = StubConfig()
+
+
+def _response_for(prompt):
+    if "merge patch" in prompt:
+        payload = SAMPLE_PATCH
+    elif "ITINERARY SKELETON" in prompt:
+        payload = SAMPLE_SKELETON
+    elif "TIMELINE SLOT DETAILS" in prompt:
+        payload = {"slots": [SAMPLE_SLOT_DETAILS] * max(1, len(re.findall(r"^Slot \d+:", prompt, re.MULTILINE)))}
+    elif "BACKUP OPTIONS only" in prompt:
+        payload = SAMPLE_BACKUPS
+    elif "LOGISTICS only" in prompt:
+        payload = SAMPLE_LOGISTICS
+    elif "DETAILED ITINERARY" in prompt or "timeline" in prompt:
+        payload = SAMPLE_ITINERARY
+    else:
+        payload = SAMPLE_PLAN
+    text = json.dumps(payload, ensure_ascii=False)
+    if config.random.random() < config.malformed_rate:
+        # Typical model slip-ups: prose before the object and a trailing comma.
+        text = "Here is your plan:\n" + text[:-1] + ",}"
+    return text
+
+
+class _Usage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class _FinishReason:
+    name = "STOP"
+
+
+class _Candidate:
+    finish_reason = _FinishReason()
+
+
+class StubResponse:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+        self.candidates = [_Candidate()]
+
+
+class StubStreamedResponse(StubResponse):
+    def __iter__(self):
+        started = time.monotonic()
+        time.sleep(config.latency)
+        for start in range(0, len(self.text), config.chunk_size):
+            yield StubResponse("", self.text[start:start + config.chunk_size])
+            time.sleep(config.chunk_delay)
+        config.add_call(started, time.monotonic())
+
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class StubGenerativeModel:
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text = _response_for(prompt)
+        if stream:
+            return StubStreamedResponse(prompt, text)
+        started = time.monotonic()
+        chunk_count = max(1, -(-len(text) // config.chunk_size))
+        time.sleep(config.latency + config.chunk_delay * chunk_count)
+        config.add_call(started, time.monotonic())
+        return StubResponse(prompt, text)
+
+    def count_tokens(self, prompt, **kwargs):
+        return _TokenCount(len(prompt) // 4)
+
+
+def install():
+    """Register the stub as ``google.generativeai`` (replacing the real SDK if loaded)."""
+    try:
+        import google as google_package  # Namespace package shared with protobuf and api_core
+    except ImportError:
+        google_package = types.ModuleType("google")
+        google_package.__path__ = []
+        sys.modules["google"] = google_package
+    stub = types.ModuleType("google.generativeai")
+    stub.GenerativeModel = StubGenerativeModel
+    stub.configure = lambda **kwargs: None
+    sys.modules["google.generativeai"] = stub
+    google_package.generativeai = stub
+    return stub
@@ -1,884 +1,186 @@
 import streamlit as st
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
-import json
 import math # For rounding
 import random
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 # --- Configuration & Setup ---
-load_dotenv()
-
-# --- Example Date Plans for Surprise Me ---
-example_date_plans = [
-    {
-        "theme": "Romantic ❤️",
-        "activity": "At Home 🏠",
-        "budget": 30,
-        "prep_time": "30 minutes",
-        "duration": 2,
-        "planning_style": "Planning For Her",
-        "city": "Paris",
-        "include_location": True,
-        "custom_input": "Candlelit dinner, soft music, rose petals"
-    },
-    {
-        "theme": "Adventure 🚀",
-        "activity": "Outdoor Adventure 🌳",
-        "budget": 100,
-        "prep_time": "8 hours",
-        "duration": 6,
-        "planning_style": "Planning Together",
-        "city": "Denver",
-        "include_location": True,
-        "custom_input": "Hiking, picnic with a view, sunset watching"
-    },
-    {
-        "theme": "Fun 🎉",
-        "activity": "Out (Casual)🚶",
-        "budget": 60,
-        "prep_time": "2 hours",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "Austin",
-        "include_location": True,
-        "custom_input": "Live music, food trucks, bar hopping"
-    },
-    {
-        "theme": "Artsy 🎨",
-        "activity": "Creative/DIY 🎨",
-        "budget": 45,
-        "prep_time": "1 day",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "New York",
-        "include_location": True,
-        "custom_input": "Pottery class, wine and paint, gallery walk"
-    },
-    {
-        "theme": "Foodie 🍲",
-        "activity": "Out (Fancy)👗",
-        "budget": 150,
-        "prep_time": "1 week",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "San Francisco",
-        "include_location": True,
-        "custom_input": "Michelin star restaurant tour, wine pairing, dessert bar"
-    },
-    {
-        "theme": "Chill 🧘",
-        "activity": "Relax & Unwind 🛀",
-        "budget": 80,
-        "prep_time": "2 hours",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Portland",
-        "include_location": True,
-        "custom_input": "Couple's spa, hot springs, meditation garden"
-    },
-    {
-        "theme": "Intellectual 🧠",
-        "activity": "Learning Together 📚",
-        "budget": 25,
-        "prep_time": "30 minutes",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Boston",
-        "include_location": True,
-        "custom_input": "Museum visit, intellectual debate, bookstore browsing"
-    },
-    {
-        "theme": "Nostalgic 🕰️",
-        "activity": "Out (Casual)🚶",
-        "budget": 40,
-        "prep_time": "1 day",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "Chicago",
-        "include_location": True,
-        "custom_input": "Retro arcade, vintage photo booth, 50s diner"
-    },
-    {
-        "theme": "Mysterious 🕵️",
-        "activity": "Out (Casual)🚶",
-        "budget": 70,
-        "prep_time": "1 week",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "London",
-        "include_location": True,
-        "custom_input": "Escape room, murder mystery dinner, speakeasy bar"
-    },
-    {
-        "theme": "Homebody 🏡",
-        "activity": "At Home 🏠",
-        "budget": 20,
-        "prep_time": "30 minutes",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "",
-        "include_location": False,
-        "custom_input": "Board game marathon, home cooked meal, cozy movie night"
-    },
-    {
-        "theme": "Fun 🎉",
-        "activity": "Out (Fancy)👗",
-        "budget": 120,
-        "prep_time": "1 week",
-        "duration": 5,
-        "planning_style": "Planning For Her",
-        "city": "Las Vegas",
-        "include_location": True,
-        "custom_input": "Magic show, fancy dinner, rooftop cocktails"
-    },
-    {
-        "theme": "Adventure 🚀",
-        "activity": "Outdoor Adventure 🌳",
-        "budget": 80,
-        "prep_time": "1 day",
-        "duration": 8,
-        "planning_style": "Planning Together",
-        "city": "Seattle",
-        "include_location": True,
-        "custom_input": "Kayaking, island ferry, waterfront seafood"
-    },
-    {
-        "theme": "Romantic ❤️",
-        "activity": "Out (Fancy)👗",
-        "budget": 200,
-        "prep_time": "1 month",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "Miami",
-        "include_location": True,
-        "custom_input": "Sunset yacht cruise, beachfront dining, couples dance lessons"
-    },
-    {
-        "theme": "Foodie 🍲",
-        "activity": "Out (Casual)🚶",
-        "budget": 50,
-        "prep_time": "2 hours",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "New Orleans",
-        "include_location": True,
-        "custom_input": "Food truck tour, cooking class, local market exploration"
-    },
-    {
-        "theme": "Artsy 🎨",
-        "activity": "Out (Casual)🚶",
-        "budget": 35,
-        "prep_time": "8 hours",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "Montreal",
-        "include_location": True,
-        "custom_input": "Street art tour, indie gallery hop, artisan coffee shops"
-    },
-    {
-        "theme": "Chill 🧘",
-        "activity": "At Home 🏠",
-        "budget": 15,
-        "prep_time": "30 minutes",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "",
-        "include_location": False,
-        "custom_input": "Meditation session, home yoga, herbal tea ceremony"
-    },
-    {
-        "theme": "Fun 🎉",
-        "activity": "Outdoor Adventure 🌳",
-        "budget": 65,
-        "prep_time": "8 hours",
-        "duration": 6,
-        "planning_style": "Planning Together",
-        "city": "San Diego",
-        "include_location": True,
-        "custom_input": "Beach volleyball, surfing lessons, boardwalk carnival"
-    },
-    {
-        "theme": "Mysterious 🕵️",
-        "activity": "Out (Fancy)👗",
-        "budget": 150,
-        "prep_time": "1 week",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "Prague",
-        "include_location": True,
-        "custom_input": "Secret underground bar, mystery walking tour, midnight river cruise"
-    },
-    {
-        "theme": "Intellectual 🧠",
-        "activity": "Out (Casual)🚶",
-        "budget": 30,
-        "prep_time": "2 hours",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Oxford",
-        "include_location": True,
-        "custom_input": "Library tour, philosophical cafe, poetry reading"
-    },
-    {
-        "theme": "Nostalgic 🕰️",
-        "activity": "At Home 🏠",
-        "budget": 25,
-        "prep_time": "1 day",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "",
-        "include_location": False,
-        "custom_input": "Recreating first date, old photo albums, classic movies"
-    },
-    {
-        "theme": "Foodie 🍲",
-        "activity": "At Home 🏠",
-        "budget": 40,
-        "prep_time": "1 day",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "",
-        "include_location": False,
-        "custom_input": "International cuisine night, wine pairing, dessert making"
-    },
-    {
-        "theme": "Adventure 🚀",
-        "activity": "Out (Casual)🚶",
-        "budget": 55,
-        "prep_time": "2 hours",
-        "duration": 5,
-        "planning_style": "Planning Together",
-        "city": "Phoenix",
-        "include_location": True,
-        "custom_input": "Rock climbing gym, go-kart racing, laser tag"
-    },
-    {
-        "theme": "Romantic ❤️",
-        "activity": "Outdoor Adventure 🌳",
-        "budget": 70,
-        "prep_time": "8 hours",
-        "duration": 4,
-        "planning_style": "Planning For Her",
-        "city": "Nashville",
-        "include_location": True,
-        "custom_input": "Horseback riding, sunset picnic, stargazing"
-    },
-    {
-        "theme": "Artsy 🎨",
-        "activity": "Creative/DIY 🎨",
-        "budget": 60,
-        "prep_time": "1 week",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Amsterdam",
-        "include_location": True,
-        "custom_input": "Canal painting class, tulip arranging, cheese making workshop"
-    },
-    {
-        "theme": "Homebody 🏡",
-        "activity": "Creative/DIY 🎨",
-        "budget": 30,
-        "prep_time": "2 hours",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "",
-        "include_location": False,
-        "custom_input": "DIY craft project, baking together, garden planning"
-    },
-    {
-        "theme": "Fun 🎉",
-        "activity": "Learning Together 📚",
-        "budget": 45,
-        "prep_time": "1 day",
-        "duration": 2,
-        "planning_style": "Planning Together",
-        "city": "Los Angeles",
-        "include_location": True,
-        "custom_input": "Comedy improv class, stand-up show, backstage tour"
-    },
-    {
-        "theme": "Chill 🧘",
-        "activity": "Outdoor Adventure 🌳",
-        "budget": 20,
-        "prep_time": "30 minutes",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Vancouver",
-        "include_location": True,
-        "custom_input": "Forest bathing, lakeside meditation, nature photography"
-    },
-    {
-        "theme": "Romantic ❤️",
-        "activity": "Learning Together 📚",
-        "budget": 90,
-        "prep_time": "1 week",
-        "duration": 3,
-        "planning_style": "Planning For Her",
-        "city": "Barcelona",
-        "include_location": True,
-        "custom_input": "Couples flamenco dancing, Spanish cooking class, wine tasting"
-    },
-    {
-        "theme": "Foodie 🍲",
-        "activity": "Volunteer/Give Back 🤝",
-        "budget": 10,
-        "prep_time": "1 week",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "Detroit",
-        "include_location": True,
-        "custom_input": "Community kitchen volunteering, food bank sorting, neighborhood feast"
-    },
-    {
-        "theme": "Intellectual 🧠",
-        "activity": "Creative/DIY 🎨",
-        "budget": 50,
-        "prep_time": "1 day",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "Edinburgh",
-        "include_location": True,
-        "custom_input": "Historical writing workshop, castle tour, literary pub crawl"
-    },
-    {
-        "theme": "Adventure 🚀",
-        "activity": "Out (Fancy)👗",
-        "budget": 180,
-        "prep_time": "1 month",
-        "duration": 6,
-        "planning_style": "Planning For Her",
-        "city": "Dubai",
-        "include_location": True,
-        "custom_input": "Desert safari, luxury dinner, helicopter tour"
-    },
-    {
-        "theme": "Nostalgic 🕰️",
-        "activity": "Creative/DIY 🎨",
-        "budget": 35,
-        "prep_time": "1 week",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "Memphis",
-        "include_location": True,
-        "custom_input": "Vinyl record shopping, vintage fashion, retro photoshoot"
-    },
-    {
-        "theme": "Mysterious 🕵️",
-        "activity": "Learning Together 📚",
-        "budget": 60,
-        "prep_time": "1 day",
-        "duration": 4,
-        "planning_style": "Planning Together",
-        "city": "Salem",
-        "include_location": True,
-        "custom_input": "Ghost tour, witchcraft museum, tarot reading class"
-    },
-    {
-        "theme": "Homebody 🏡",
-        "activity": "Relax & Unwind 🛀",
-        "budget": 40,
-        "prep_time": "2 hours",
-        "duration": 3,
-        "planning_style": "Planning Together",
-        "city": "",
-        "include_location": False,
-        "custom_input": "Home spa day, couples massage tutorial, meditation app journey"
-    },
-    {
-        "theme": "Artsy 🎨",
-        "activity": "Out (Fancy)👗",
-        "budget": 140,
-        "prep_time": "1 week",
-        "duration": 5,
-        "planning_style": "Planning For Her",
-        "city": "Vienna",
-        "include_location": True,
-        "custom_input": "Opera house visit, classical concert, art museum gala"
-    }
-]
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """Read .env once per process instead of on every rerun."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Before the app modules below read their DATENIGHT_* settings at import.
+load_environment()
+
+import background_jobs
+from date_planner import (
+    ACTIVITY_TYPES, PLANNING_STYLE_OPTIONS, PREP_TIME_OPTIONS, THEMES,
+    generate_date_plan_with_addition, generate_date_plan_with_gemini, generate_detailed_itinerary,
+    location_prompt_line_for, planning_style_prompt_line_for,
+)
+from gemini_models import AVAILABLE_MODELS, DEFAULT_MODEL
+from llm_clients import client_registry
+from llm_gateway import open_circuits
+from llm_telemetry import summary as llm_call_summary
+from model_router import choose_model, routed_call, stats as routing_stats
+from plan_cache import in_flight, response_cache
+from plan_prefetch import PlanPrefetcher
+from plan_store import plan_store
+from plan_render import itinerary_html, plan_html, render_partial_plan_html
+from rate_limiter import rate_limiter
+from similar_plans import DEFAULT_THRESHOLD, similar_plan_index
+from surprise_library import example_date_plans, surprise_library
+from theme_assets import theme_stylesheet_html
+
+JOB_WAIT_SLICE_SECONDS = 0.25
 
 # --- Helper Functions ---
 
-def generate_detailed_itinerary(api_key, selected_model_name, original_plan, 
-                                original_user_input=None, location_prompt_line=None,
-                                planning_style_prompt_line=None):
-    """Generate a detailed itinerary based on the original plan and user input"""
-    if not api_key:
-        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
-    if not selected_model_name:
-        return {"error": "Please select a Gemini model in the sidebar."}
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name=selected_model_name)
-        
-        prompt = f"""
-        You are a creative and helpful date night planning assistant. 
-        You have already provided a date plan, and now the user wants a MORE DETAILED itinerary with ACTUAL places and activities.
-        
-        CRITICALLY IMPORTANT: The user's original custom input contained specific timing and activity preferences that MUST be incorporated:
-        User's Original Input: "{original_user_input if original_user_input else 'None'}"
-        
-        {planning_style_prompt_line if planning_style_prompt_line else ""}
-        {location_prompt_line if location_prompt_line else ""}
-        
-        Original Plan Details:
-        {json.dumps(original_plan, indent=2)}
-        
-        IMPORTANT: Now create a DETAILED ITINERARY that:
-        1. MUST incorporate any specific timing mentioned in the user's original input (e.g., "start at 5pm", "dinner at 7", etc.)
-        2. MUST include any specific activities or venues mentioned by the user
-        3. Provides specific timings for each activity (respecting user's timing preferences)
-        4. Suggests ACTUAL restaurant names, venues, or activity locations (search the internet for real places)
-        5. Includes addresses when possible
-        6. Notes reservation requirements or booking links if applicable
-        7. Offers backup options for each activity
-        8. Estimates driving/transportation time between locations
-        9. Includes specific menu recommendations if applicable
-        10. Provides parking information if relevant
-        
-        If the user hasn't specified a location, suggest activities that could work in any major city, or note that they should specify their location for more accurate recommendations.
-        
-        **IMPORTANT INSTRUCTION:**
-        Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
-        The JSON object should follow this structure:
-        
-        {{
-          "title": "{original_plan.get('title', 'Date Night')} - Detailed Itinerary",
-          "location_note": "[If no specific location was mentioned, note this and suggest general options]",
-          "timeline": [
-            {{
-              "time": "6:00 PM",
-              "activity": "Main Activity Name",
-              "location": "Specific Venue Name",
-              "address": "123 Main St, City, State",
-              "details": "Detailed description of what to do here",
-              "booking_required": true/false,
-              "booking_link": "website.com/reservations (if applicable)",
-              "cost_estimate": "$XX per person",
-              "duration": "1.5 hours",
-              "parking": "Street parking available / Valet available / Free lot",
-              "tips": ["Tip 1", "Tip 2"]
-            }}
-          ],
-          "backup_options": [
-            {{
-              "for_activity": "Main Activity Name",
-              "alternative": "Alternative Venue Name",
-              "reason": "Why this is a good backup",
-              "details": "Brief description"
-            }}
-          ],
-          "transportation_notes": "Estimated 15 min drive between venues, consider Uber if drinking",
-          "total_estimated_cost": "$XXX for two people",
-          "special_considerations": ["Consideration 1", "Consideration 2"],
-          "weather_contingency": "If weather is bad, consider..."
-        }}
-        
-        Make sure to search for REAL places and provide ACTUAL recommendations, not generic placeholders.
-        """
-        
-        response = model.generate_content(prompt)
-        raw_text_response = ""
-        if hasattr(response, 'text'): 
-            raw_text_response = response.text
-        elif isinstance(response, str): 
-            raw_text_response = response
-        elif hasattr(response, 'parts') and response.parts: 
-            raw_text_response = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        else: 
-            return {"error": f"Unexpected response format from API: {str(response)}"}
-        
-        if raw_text_response.strip().startswith("```json"):
-            raw_text_response = raw_text_response.strip()[7:]
-            if raw_text_response.strip().endswith("```"): 
-                raw_text_response = raw_text_response.strip()[:-3]
-        
-        try:
-            return json.loads(raw_text_response.strip())
-        except json.JSONDecodeError as e:
-            error_detail = f"Failed to parse JSON. Error: {e}. Raw (first 500 chars): '{raw_text_response[:500]}...'"
-            return {"error": error_detail}
-    except Exception as e: 
-        return {"error": f"An error occurred: {e}"}
-
-def generate_date_plan_with_addition(api_key, selected_model_name,
-                                    original_plan, addition,
-                                    theme, activity_type,
-                                    budget_dollars, prep_time_text,
-                                    time_budget_hours,
-                                    planning_style_prompt_line,
-                                    location_prompt_line=None):
-    """Generate a modified date plan that incorporates user's addition while staying close to original"""
-    if not api_key:
-        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
-    if not selected_model_name:
-        return {"error": "Please select a Gemini model in the sidebar."}
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name=selected_model_name)
-
-        time_budget_line = f"- Maximum Activity Duration: {time_budget_hours} hours." if time_budget_hours is not None else ""
-        
-        actual_planning_style_for_json = "Not specified"
-        if planning_style_prompt_line:
-            parts = planning_style_prompt_line.split(': ', 1)
-            if len(parts) > 1:
-                actual_planning_style_for_json = parts[1].strip()
-
-        prompt = f"""
-        You are a creative and helpful date night planning assistant.
-        The user has already received a date plan and now wants to MODIFY it by adding a specific element.
-        Your goal is to update the existing plan while keeping it as similar as possible to the original.
-        
-        ORIGINAL PLAN:
-        {json.dumps(original_plan, indent=2)}
-        
-        USER'S ADDITION REQUEST: "{addition}"
-        
-        CRITICAL INSTRUCTIONS:
-        1. Keep the plan as close to the original as possible
-        2. Incorporate the user's addition seamlessly into the existing plan
-        3. Maintain the same theme, budget constraints, and overall structure
-        4. Only change what's necessary to accommodate the addition
-        5. If the addition conflicts with the budget, suggest budget-friendly ways to include it
-        
-        {planning_style_prompt_line}
-        {location_prompt_line if location_prompt_line else ""}
-        
-        Original Preferences (for reference):
-        - Theme: {theme}
-        - Activity Type: {activity_type}
-        - Budget: ${budget_dollars}
-        - Preparation Time: {prep_time_text}
-        {time_budget_line}
-        
-        **IMPORTANT INSTRUCTION:**
-        Your response MUST be a single, valid JSON object following the same structure as the original.
-        Update the relevant fields to reflect the addition while keeping as much of the original plan intact as possible.
-        
-        {{
-          "title": "[Updated title if needed, or keep original]",
-          "theme": "{theme}",
-          "activity_type": "{activity_type}",
-          "budget_dollars": {budget_dollars},
-          "prep_time": "{prep_time_text}",
-          "time_budget_hours": {time_budget_hours},
-          "planning_style": "{actual_planning_style_for_json}",
-          "model_used": "{selected_model_name}",
-          "emoji_story": {{
-            "story": "[Updated emoji story reflecting the addition]",
-            "description": "[Updated description of the emoji journey]"
-          }},
-          "plan_details": {{
-            "step_1_title": "[Update if needed to incorporate addition]",
-            "step_1_description": "[Update if needed to incorporate addition]",
-            "step_2_title": "[Update if needed to incorporate addition]",
-            "step_2_description": "[Update if needed to incorporate addition]",
-            "food_drinks_suggestions": "[Update if addition relates to food/drinks]",
-            "ambiance_extras_suggestions": "[Update if addition relates to ambiance/extras]"
-          }},
-          "tips_and_considerations": [
-            "[Update tips to reflect the addition]",
-            "[Add new tip if needed]"
-          ]
-        }}
-        """
-        
-        response = model.generate_content(prompt)
-        raw_text_response = ""
-        if hasattr(response, 'text'): raw_text_response = response.text
-        elif isinstance(response, str): raw_text_response = response
-        elif hasattr(response, 'parts') and response.parts: raw_text_response = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        else: return {"error": f"Unexpected response format from API: {str(response)}"}
-
-        if raw_text_response.strip().startswith("```json"):
-            raw_text_response = raw_text_response.strip()[7:]
-            if raw_text_response.strip().endswith("```"): raw_text_response = raw_text_response.strip()[:-3]
-        try:
-            return json.loads(raw_text_response.strip())
-        except json.JSONDecodeError as e:
-            error_detail = f"Failed to parse JSON. Error: {e}. Raw (first 500 chars): '{raw_text_response[:500]}...'"
-            return {"error": error_detail}
-    except Exception as e: return {"error": f"An error occurred: {e}"}
-
-def generate_date_plan_with_gemini(api_key, selected_model_name,
-                                   theme, activity_type,
-                                   budget_dollars, prep_time_text, user_input,
-                                   time_budget_hours,
-                                   planning_style_prompt_line,
-                                   location_prompt_line=None):
-    if not api_key:
-        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
-    if not selected_model_name:
-        return {"error": "Please select a Gemini model in the sidebar."}
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name=selected_model_name)
-
-        time_budget_line = f"- Maximum Activity Duration: {time_budget_hours} hours." if time_budget_hours is not None else ""
-        
-        actual_planning_style_for_json = "Not specified"
-        if planning_style_prompt_line:
-            parts = planning_style_prompt_line.split(': ', 1)
-            if len(parts) > 1:
-                actual_planning_style_for_json = parts[1].strip()
-
-        prompt = f"""
-        You are a creative and helpful date night planning assistant.
-        Your goal is to generate a fun and suitable date night plan based on the user's preferences.
-        The user is utilizing the '{selected_model_name}' model.
-        {planning_style_prompt_line}
-        {location_prompt_line if location_prompt_line else ""}
-
-        User Preferences:
-        - Theme: {theme}
-        - Activity Type: {activity_type}
-        - Budget: ${budget_dollars} (The user has exactly ${budget_dollars} to spend on this date)
-        - Preparation Time Available: {prep_time_text} (The user wants something that can be prepared within {prep_time_text})
-        {time_budget_line}
-        - User's specific suggestions or restrictions: "{user_input if user_input else 'None'}"
-
-
-        **IMPORTANT INSTRUCTION:**
-        Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
-        The JSON object should follow this structure:
-
-        {{
-          "title": "[Catchy Date Night Title - concise, max 5-7 words]",
-          "theme": "{theme}",
-          "activity_type": "{activity_type}",
-          "budget_dollars": {budget_dollars},
-          "prep_time": "{prep_time_text}",
-          "time_budget_hours": {time_budget_hours},
-          "planning_style": "{actual_planning_style_for_json}",
-          "model_used": "{selected_model_name}",
-          "emoji_story": {{
-            "story": "[A long string of emojis telling the emotional journey of the date - should be 20-40 emojis that capture the progression, emotions, activities, and moments]",
-            "description": "[Brief explanation of what the emoji story represents]"
-          }},
-          "plan_details": {{
-            "step_1_title": "[Concise title for Step 1]",
-            "step_1_description": "[Concise description for Step 1, 1-2 sentences]",
-            "step_2_title": "[Concise title for Step 2]",
-            "step_2_description": "[Concise description for Step 2, 1-2 sentences]",
-            "food_drinks_suggestions": "[Optional: Very concise food/drinks. 1 sentence max.]",
-            "ambiance_extras_suggestions": "[Optional: Very concise ambiance/extras. 1 sentence max.]"
-          }},
-          "tips_and_considerations": [
-            "[Very Concise Tip 1, max 1 sentence]",
-            "[Very Concise Tip 2 (if applicable), max 1 sentence]"
-          ]
-        }}
-
-        For emoji_story, create a sequence of 20-40 emojis that tells the emotional journey of this date night.
-        The emojis should represent:
-        - The initial mood and anticipation
-        - Getting ready and excitement
-        - Meeting or starting the date
-        - The activities and experiences
-        - Food and drinks (if applicable)  
-        - Emotional highs and intimate moments
-        - The progression through the evening
-        - The ending and aftermath
-        
-        Make it like a mini emotional movie told only through emojis. Be creative and capture the essence of the date theme.
-        
-        Ensure all string values within the JSON are extremely concise and to the point. Brevity is key.
-        If a time budget is provided, suggest activities that fit within that duration.
-        """
-        response = model.generate_content(prompt)
-        raw_text_response = ""
-        if hasattr(response, 'text'): raw_text_response = response.text
-        elif isinstance(response, str): raw_text_response = response
-        elif hasattr(response, 'parts') and response.parts: raw_text_response = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        else: return {"error": f"Unexpected response format from API: {str(response)}"}
+def current_preferences():
+    """Preference values as the preferences panel last left them in session_state."""
+    return {
+        "theme": st.session_state.theme_value,
+        "activity_type": st.session_state.activity_value,
+        "budget_dollars": st.session_state.budget_value,
+        "prep_time_text": st.session_state.prep_value,
+        "time_budget_hours": st.session_state.duration_value,
+        "user_input": st.session_state.get("user_custom_input_area_v2", ""),
+        "planning_style_prompt_line": planning_style_prompt_line_for(st.session_state.planning_value),
+        "location_prompt_line": location_prompt_line_for(st.session_state.get("include_location", False), st.session_state.get("city_input", "")),
+        "city": st.session_state.get("city_input", "") if st.session_state.get("include_location", False) else "",
+    }
 
-        if raw_text_response.strip().startswith("```json"):
-            raw_text_response = raw_text_response.strip()[7:]
-            if raw_text_response.strip().endswith("```"): raw_text_response = raw_text_response.strip()[:-3]
-        try:
-            return json.loads(raw_text_response.strip())
-        except json.JSONDecodeError as e:
-            error_detail = f"Failed to parse JSON. Error: {e}. Raw (first 500 chars): '{raw_text_response[:500]}...'"
-            return {"error": error_detail}
-    except Exception as e: return {"error": f"An error occurred: {e}"}
+def generate_with_routing(flow, selected_model, generate, on_partial=None, on_queue=None):
+    """Run generate(model_name, on_partial, on_queue) on the sidebar's model or, with routing
+    on, on the fastest healthy model for the flow. Returns (result, model_name)."""
+    if not st.session_state.get("route_models"):
+        return generate(selected_model, on_partial, on_queue), selected_model
+    hedge = st.session_state.get("hedge_requests", False)
+    # Hedged attempts run on worker threads, which cannot update the page.
+    queue_callback = None if hedge else on_queue
+    return routed_call(flow, AVAILABLE_MODELS, lambda model_name, relay: generate(model_name, relay, queue_callback),
+                       hedge=hedge, on_partial=on_partial)
+
+def start_itinerary(plan, api_key, model_name, structured_output, use_cache):
+    """Start generating the plan's itinerary on a background worker."""
+    preferences = current_preferences()
+    sectioned = st.session_state.get("sectioned_itinerary", False)
+    def itinerary_on(itinerary_model, _on_partial=None):
+        return generate_detailed_itinerary(
+            api_key, itinerary_model, plan,
+            original_user_input=preferences["user_input"],
+            location_prompt_line=preferences["location_prompt_line"],
+            planning_style_prompt_line=preferences["planning_style_prompt_line"],
+            structured_output=structured_output,
+            sectioned=sectioned,
+            city=preferences["city"],
+            use_cache=use_cache,
+        )
+    if st.session_state.get("route_models"):
+        hedge = st.session_state.get("hedge_requests", False)
+        st.session_state.itinerary_job = background_jobs.submit(
+            lambda: routed_call("itinerary", AVAILABLE_MODELS, itinerary_on, hedge=hedge)[0]
+        )
+    else:
+        st.session_state.itinerary_job = background_jobs.submit(itinerary_on, model_name)
+
+def show_new_plan(plan_output, api_key, model_name, structured_output, use_cache, addition=None):
+    """Make plan_output the current plan, save it, and start its itinerary on a background worker right away."""
+    parent_id = st.session_state.get("current_plan_id") if addition else None
+    st.session_state.generated_plan_content = plan_output
+    st.session_state.detailed_itinerary = None  # Clear any existing itinerary
+    st.session_state.itinerary_job = None
+    st.session_state.current_plan_id = plan_store.save_plan(plan_output, model_name, current_preferences()["city"],
+                                                            parent_id=parent_id, addition=addition)
+    if isinstance(plan_output, dict) and "title" in plan_output:
+        start_itinerary(plan_output, api_key, model_name, structured_output, use_cache)
+
+def show_saved_plan(plan_id, api_key, structured_output, use_cache):
+    """Make a stored plan the current plan; its itinerary is generated only if none was stored."""
+    record = plan_store.load(plan_id)
+    if record is None:
+        return
+    st.session_state.generated_plan_content = record["plan"]
+    st.session_state.detailed_itinerary = record["itinerary"]
+    st.session_state.itinerary_job = None
+    st.session_state.current_plan_id = plan_id
+    if record["itinerary"] is None:
+        start_itinerary(record["plan"], api_key, record["model"], structured_output, use_cache)
+
+def prefetch_plan(api_key, model_name):
+    """Schedule a speculative generation of the plan for the current preferences,
+    or cancel the pending one if prefetching is off."""
+    if "plan_prefetcher" not in st.session_state:
+        st.session_state.plan_prefetcher = PlanPrefetcher()
+    prefetcher = st.session_state.plan_prefetcher
+    enabled = st.session_state.get("speculative_prefetch") and st.session_state.get("use_response_cache", True)
+    if not (enabled and api_key and model_name):
+        prefetcher.cancel()
+        return
+    if st.session_state.get("route_models"):
+        model_name = choose_model("plan", AVAILABLE_MODELS)
+    preferences = current_preferences()
+    structured_output = st.session_state.get("structured_output", True)
+    def generate(cancel):
+        # Streamed so cancellation takes effect between chunks; a Generate click that
+        # joins this call in flight still sees the partial plan.
+        return generate_date_plan_with_gemini(
+            api_key, model_name,
+            preferences["theme"], preferences["activity_type"],
+            preferences["budget_dollars"],
+            preferences["prep_time_text"],
+            preferences["user_input"],
+            preferences["time_budget_hours"],
+            preferences["planning_style_prompt_line"],
+            preferences["location_prompt_line"],
+            on_partial=lambda partial: None,
+            structured_output=structured_output,
+            cancel=cancel,
+        )
+    prefetcher.schedule((model_name, tuple(sorted(preferences.items()))), generate)
+
+def queue_indicator(placeholder=None):
+    """on_queue callback showing the call's place in the rate-limit queue, in placeholder
+    or in a new element where it is called; cleared once the call is admitted."""
+    note = placeholder if placeholder is not None else st.empty()
+    def show_queue_position(position, wait_seconds):
+        if position:
+            note.info(f"⏳ Gemini is busy. You are #{position} in line, about {wait_seconds}s to go...")
+        else:
+            note.empty()
+    return show_queue_position
+
+def wait_for_job(job, message):
+    """Wait for a background job in short slices, showing the elapsed time.
+    Each visible update is a point where Streamlit can end this run for a newer
+    interaction; the job keeps running and the next run picks it up."""
+    started = time.monotonic()
+    with st.spinner(message):
+        elapsed_note = st.empty()
+        shown_seconds = 0
+        while True:
+            try:
+                result = job.result(timeout=JOB_WAIT_SLICE_SECONDS)
+                break
+            except FutureTimeoutError:
+                elapsed_seconds = int(time.monotonic() - started)
+                if elapsed_seconds != shown_seconds:
+                    shown_seconds = elapsed_seconds
+                    elapsed_note.caption(f"{elapsed_seconds}s")
+            except Exception as e:
+                result = {"error": f"An error occurred: {e}"}
+                break
+        elapsed_note.empty()
+    return result
 
 # --- Streamlit App UI ---
 st.set_page_config(page_title="Date Night Planner", layout="wide", initial_sidebar_state="expanded")
 
 # --- Custom CSS ---
-st.markdown("""
-    <style>
-        html, body, #root, .stApp {
-            height: 100%; overflow: hidden; background-color: #0E1117; color: #FAFAFA;
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif, "Apple Color Emoji", "Segoe UI Emoji";
-        }
-        .main .block-container {padding-top: 1.5rem; padding-bottom: 1rem; padding-left: 2rem; padding-right: 2rem;}
-        h1 {font-size: 2.2rem !important; color: #FF69B4; text-align: center; margin-bottom: 1rem !important; font-weight: 700;}
-        .right-column-content-wrapper {margin-top: 0 !important; padding-top: 0 !important;}
-        .right-column-subheader {font-size: 1.5rem !important; font-weight: 600; color: #A9D5FF; margin-top: 0 !important; margin-bottom: 0.75rem !important; text-align: center;}
-        .left-column-section-title {font-size: 1.1rem !important; font-weight: 600; color: #BDC3C7; margin-top: 0.8rem !important; margin-bottom: 0.2rem !important; border-bottom: 1px solid #333A44; padding-bottom: 0.1rem;}
-        div[data-testid="stSelectbox"] > label,
-        div[data-testid="stSlider"] > label,
-        div[data-testid="stTextArea"] > label,
-        div[data-testid="stRadio"] > label {
-            margin-bottom: 0.2rem !important; font-size: 0.9rem; font-weight: 500; color: #A0A7B3;
-        }
-        div[data-testid="stRadio"] > div[role="radiogroup"] {display: flex; flex-direction: row; justify-content: center; gap: 5px;}
-        div[data-testid="stRadio"] > div[role="radiogroup"] > label {
-            background-color: #262B34; color: #A0A7B3; border: 1px solid #333A44;
-            padding: 0.4rem 0.8rem; border-radius: 6px; cursor: pointer;
-            transition: background-color 0.2s, color 0.2s; font-size: 0.85rem;
-        }
-        div[data-testid="stRadio"] > div[role="radiogroup"] > label:has(input:checked) {background-color: #FF69B4; color: white; border-color: #FF69B4;}
-        div[data-testid="stRadio"] > div[role="radiogroup"] > label:hover:not(:has(input:checked)) {background-color: #333A44;}
-        [data-testid="stVerticalBlock"] > [style*="flex-direction: column;"] > [data-testid="stVerticalBlock"] {gap: 0.3rem !important;}
-        .stTextArea textarea {background-color: #1C2028 !important; color: #FAFAFA !important; border: 1px solid #333A44 !important; border-radius: 6px !important; min-height: 70px !important;}
-        .stTextArea textarea:focus {border-color: #FF69B4 !important; box-shadow: 0 0 0 0.2rem rgba(255, 105, 180, 0.25) !important;}
-        div[data-testid="stButton"] > button {background-color: #FF69B4; color: white; border: none; padding: 0.6rem 1.5rem; border-radius: 8px; font-weight: 600; font-size: 1rem; transition: background-color 0.2s ease-in-out, transform 0.1s ease; box-shadow: 0 2px 5px rgba(0,0,0,0.2); margin-top: 0.5rem;}
-        div[data-testid="stButton"] > button:hover {background-color: #FF85C8; transform: translateY(-1px);}
-        div[data-testid="stButton"] > button:active {background-color: #E05A9A; transform: translateY(0px);}
-        [data-testid="stSidebar"] {background-color: #1C2028; padding: 1rem;}
-        [data-testid="stSidebar"] .stTextInput input, [data-testid="stSidebar"] .stSelectbox div[data-baseweb="select"] > div {background-color: #262B34; color: #FAFAFA; border: 1px solid #333A44;}
-        [data-testid="stSidebar"] h2 {color: #A9D5FF; font-size: 1.2rem;}
-        [data-testid="stSidebar"] .stMarkdown p, [data-testid="stSidebar"] .stAlert p {color: #BDC3C7;}
-        .date-plan-output-container {max-height: calc(100vh - 200px); overflow-y: auto; padding: 20px; background-color: rgba(28, 32, 40, 0.9); border: 1px solid #333A44; border-radius: 8px; color: #D0D3D4; font-size: 0.9em; line-height: 1.6; box-shadow: 0 4px 12px rgba(0,0,0,0.3); margin-top: 0.5rem; backdrop-filter: blur(10px);}
-        .plan-title {font-size: 1.6em; font-weight: 700; color: #FFD700; margin-bottom: 0.6em; text-align: center; border-bottom: 2px solid #FFD700; padding-bottom: 0.3em;}
-        .plan-meta-info {font-size: 0.95em; color: #85929E; margin-bottom: 1em; text-align: center; font-style: italic; line-height: 1.4;}
-        .plan-meta-info b {color: #AAB7B8; font-weight: 500;}
-        .plan-section-title {font-size: 1.25em; font-weight: 600; color: #76D7C4; margin-top: 1.2em; margin-bottom: 0.5em; border-bottom: 1px solid #333A44; padding-bottom: 0.2em;}
-        .plan-step-title {color: #A9D5FF; font-weight: 600;}
-        .plan-description {font-size: 1em; color: #CACFD2; margin-bottom: 0.5em; padding-left: 10px;}
-        .plan-list-item {font-size: 1em; color: #CACFD2; margin-left: 1.5em; margin-bottom: 0.4em; list-style-type: "✨ ";}
-        .plan-error-message {color: #FF6B6B; font-weight: 500; background-color: rgba(255, 107, 107, 0.1); padding: 10px; border-radius: 6px; border-left: 4px solid #FF6B6B;}
-        .plan-initial-message {color: #A9D5FF; font-style: italic; text-align: center; padding-top: 1rem; padding-bottom: 1rem; font-size: 0.95em;}
-        div[data-testid="stButton"] > button[type="button"]:not(:first-child) {
-            background-color: #4A90E2; 
-            color: white; 
-            border: none; 
-            padding: 0.5rem 1.2rem; 
-            border-radius: 6px; 
-            font-weight: 500; 
-            font-size: 0.95rem; 
-            margin-top: 1rem;
-            margin-bottom: 0.5rem;
-        }
-        div[data-testid="stButton"] > button[type="button"]:not(:first-child):hover {
-            background-color: #5BA3F5; 
-            transform: translateY(-1px);
-        }
-        div[data-testid="stButton"] > button[type="button"]:not(:first-child):active {
-            background-color: #3A7BC8; 
-            transform: translateY(0px);
-        }
-        .plan-description a {color: #4A90E2; text-decoration: none;}
-        .plan-description a:hover {color: #5BA3F5; text-decoration: underline;}
-        
-        /* Styling for checkbox labels */
-        div[data-testid="stCheckbox"] > label {
-            font-size: 0.8rem !important;
-            color: #A0A7B3;
-            margin-bottom: 0 !important;
-            padding: 0 !important;
-        }
-        
-        /* Style the location toggle similar to locks */
-        div[data-testid="stCheckbox"][key="include_location"] > label {
-            font-size: 1rem !important;
-        }
-        /* Styling for checkbox widget container */
-        div[data-testid="stCheckbox"] {
-            padding-top: 0 !important; /* MODIFIED: Was 0.8rem, caused downward shift */
-            /* margin-bottom: -0.5rem !important; /* MODIFIED: Removed, may not be needed for locks */
-        }
-
-        /* Container for lock checkboxes (within col2) */
-        .element-container:has(div[data-testid="stCheckbox"]) {
-            display: flex;
-            align-items: center; /* Vertically centers the checkbox */
-            justify-content: flex-end; /* Aligns checkbox to the right of its column */
-            height: 100%; /* Ensures the container takes full row height for alignment */
-            min-width: 50px; /* Ensures some space for the lock icon */
-        }
-
-        /* Reduce spacing between controls */
-        .stSelectbox, .stSlider, .stRadio {
-            margin-bottom: 0.5rem !important;
-        }
-        /* Keep columns together on mobile */
-        @media (max-width: 768px) {
-            div[data-testid="stHorizontalBlock"] {
-                gap: 0.5rem !important;
-            }
-            div[data-testid="stColumn"] {
-                padding: 0 !important;
-            }
-        }
-        /* Top button row styling */
-        .element-container:has(div[data-testid="stButton"]:has(button[type="secondary"])) {
-            margin-bottom: 1.5rem !important;
-        }
-        
-        
-        /* Randomize button styling */
-        div[data-testid="stButton"]:has(button:contains("🎲")) > button {
-            background-color: #9B59B6 !important;
-            margin-bottom: 0 !important;
-        }
-        div[data-testid="stButton"]:has(button:contains("🎲")) > button:hover {
-            background-color: #B47CC4 !important;
-        }
-        
-        /* Surprise Me button styling */
-        div[data-testid="stButton"]:has(button:contains("🎁")) > button {
-            background-color: #2ECC71 !important;
-            margin-bottom: 0 !important;
-        }
-        div[data-testid="stButton"]:has(button:contains("🎁")) > button:hover {
-            background-color: #3DDC84 !important;
-        }
-        
-        /* Make Addition button styling */
-        div[data-testid="stButton"]:has(button:contains("🔄")) > button {
-            background-color: #3498DB !important;
-            margin-top: 0.3rem !important;
-        }
-        div[data-testid="stButton"]:has(button:contains("🔄")) > button:hover {
-            background-color: #5DADE2 !important;
-        }
-        
-        /* Separator styling */
-        .plan-separator {
-            margin: 2.5rem 0;
-            border: none;
-            height: 2px;
-            background: linear-gradient(to right, transparent, #FFD700 20%, #FFD700 80%, transparent);
-            opacity: 0.5;
-        }
-        
-        /* Emoji story container */
-        .emoji-story-container {
-            font-size: 2em;
-            line-height: 1.5;
-            text-align: center;
-            padding: 1.5rem;
-            background-color: rgba(255, 255, 255, 0.05);
-            border-radius: 12px;
-            margin: 1.5rem 0;
-            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.2);
-            word-wrap: break-word;
-            letter-spacing: 0.05em;
-        }
-        
-        .emoji-story-description {
-            text-align: center;
-            font-style: italic;
-            color: #A9D5FF;
-            margin-top: 1rem;
-        }
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(theme_stylesheet_html(), unsafe_allow_html=True)
 
 st.markdown("<h1>💖 Date Night AI 🥂</h1>", unsafe_allow_html=True)
 
@@ -888,13 +190,11 @@ with col_btn1:
     if st.button("🎲 Randomize Settings", type="secondary", use_container_width=True):
         # Randomize theme if not locked
         if not st.session_state.get('theme_lock', False):
-            themes_list = ["Romantic ❤️", "Fun 🎉", "Chill 🧘", "Adventure 🚀", "Artsy 🎨", "Homebody 🏡", "Intellectual 🧠", "Foodie 🍲", "Mysterious 🕵️", "Nostalgic 🕰️"]
-            st.session_state.theme_value = random.choice(themes_list)
+            st.session_state.theme_value = random.choice(THEMES)
         
         # Randomize activity type if not locked
         if not st.session_state.get('activity_lock', False):
-            activity_types_list = ["At Home 🏠", "Out (Casual)🚶", "Out (Fancy)👗", "Outdoor Adventure 🌳", "Creative/DIY 🎨", "Learning Together 📚", "Volunteer/Give Back 🤝", "Relax & Unwind 🛀"]
-            st.session_state.activity_value = random.choice(activity_types_list)
+            st.session_state.activity_value = random.choice(ACTIVITY_TYPES)
         
         # Randomize budget if not locked
         if not st.session_state.get('budget_lock', False):
@@ -902,8 +202,7 @@ with col_btn1:
         
         # Randomize prep time if not locked
         if not st.session_state.get('prep_lock', False):
-            prep_time_options_list = ["30 minutes", "2 hours", "8 hours", "1 day", "1 week", "1 month"]
-            st.session_state.prep_value = random.choice(prep_time_options_list)
+            st.session_state.prep_value = random.choice(PREP_TIME_OPTIONS)
         
         # Randomize duration if not locked
         if not st.session_state.get('duration_lock', False):
@@ -911,15 +210,14 @@ with col_btn1:
         
         # Randomize planning style if not locked
         if not st.session_state.get('planning_lock', False):
-            planning_style_options_list = ["Planning Together", "Planning For Her"]
-            st.session_state.planning_value = random.choice(planning_style_options_list)
+            st.session_state.planning_value = random.choice(PLANNING_STYLE_OPTIONS)
         
         st.rerun()
 
 with col_btn2:
     if st.button("🎁 Surprise Me!", type="secondary", use_container_width=True):
         # Randomly select an example plan
-        surprise_plan = random.choice(example_date_plans)
+        surprise_plan = random.choice(example_date_plans())
         
         # Populate session state with the selected values
         st.session_state.theme_value = surprise_plan["theme"]
@@ -941,30 +239,110 @@ with col_btn2:
         st.session_state.planning_lock = False
         
         # Set flag to auto-generate after rerun
+        st.session_state.surprise_example = surprise_plan
         st.session_state.auto_generate = True
         
         st.rerun()
 
+@st.fragment
+def saved_plans_panel(api_key, structured_output, use_cache):
+    saved_city = st.text_input("City", key="saved_plans_city", placeholder="Any city")
+    saved_max_budget = st.slider("Max budget", min_value=1, max_value=200, value=200, step=1, format="$%d", key="saved_plans_max_budget")
+    saved_plans = plan_store.recent_plans(city=saved_city.strip() or None, max_budget=saved_max_budget)
+    if not saved_plans:
+        st.caption("No saved plans match.")
+        return
+    labels = {row["id"]: f"{row['title']} · ${row['budget_dollars']}" + (f" · {row['city'].title()}" if row["city"] else "") for row in saved_plans}
+    chosen_plan_id = st.selectbox("Saved plan", list(labels), format_func=labels.get, key="saved_plan_choice")
+    history = plan_store.addition_history(chosen_plan_id)
+    if history:
+        st.caption("Changes: " + " → ".join(addition for addition, _title in history))
+    if st.button("📂 Load plan", key="load_saved_plan", use_container_width=True):
+        show_saved_plan(chosen_plan_id, api_key, structured_output, use_cache)
+        st.rerun()
+
 with st.sidebar:
     st.header("🔑 API & Model Config")
     default_api_key = os.getenv("GOOGLE_API_KEY", "")
     api_key_input = st.text_input("Google AI Key", type="password", value=default_api_key, help="Get your key from Google AI Studio.")
     if not api_key_input and default_api_key: api_key_input = default_api_key
-    available_models = ["gemini-2.5-pro-preview-05-06", "gemini-2.5-flash-preview-04-17", "gemini-1.5-flash-latest", "gemini-1.5-pro-latest", "gemini-1.0-pro"]
-    default_model_index = available_models.index("gemini-2.5-flash-preview-04-17") if "gemini-2.5-flash-preview-04-17" in available_models else 0
-    selected_model = st.selectbox("Choose Gemini Model", available_models, index=default_model_index, help="Select model. Flash is faster, Pro is more capable.")
+    default_model_index = AVAILABLE_MODELS.index(DEFAULT_MODEL) if DEFAULT_MODEL in AVAILABLE_MODELS else 0
+    route_models = st.session_state.get("route_models", False)
+    selected_model = st.selectbox("Choose Gemini Model", AVAILABLE_MODELS, index=default_model_index, disabled=route_models, help="Select model. Flash is faster, Pro is more capable.")
+    route_models = st.checkbox("Route to the fastest healthy model", key="route_models", help="Pick a model per step (plan, addition, itinerary) from recent latency and error rates, skipping models too weak for the step.")
+    hedge_requests = st.checkbox("Hedge slow calls", key="hedge_requests", disabled=not route_models, help="If a call runs past its model's usual (p90) time, send it to the next-best model too and keep whichever answers first.")
+    if route_models:
+        st.caption("Routing: " + " · ".join(f"{flow} → {choose_model(flow, AVAILABLE_MODELS)}" for flow in ("plan", "addition", "itinerary")))
     st.markdown("---")
     st.info("Adjust API key & model. Ensure selected model follows JSON instructions well.")
+    with st.expander("⚡ Performance"):
+        use_response_cache = st.checkbox("Reuse cached responses", value=True, key="use_response_cache", help="Serve repeat requests from the response cache instead of calling Gemini again.")
+        stream_plan_output = st.checkbox("Stream plan as it generates", value=True, key="stream_plan_output", help="Show each part of the plan as soon as the model has written it.")
+        patch_additions = st.checkbox("Patch-based modifications", value=True, key="patch_additions", help="For 'Make Addition', have the model return only the changed fields and merge them into your plan.")
+        st.checkbox("Sectioned itinerary", value=False, key="sectioned_itinerary", help="Write the itinerary's timeline first, then each stop's details, the backups and the logistics in parallel. Faster for long dates; uses several smaller Gemini calls.")
+        structured_output = st.checkbox("Schema-constrained JSON", value=True, key="structured_output", help="Ask Gemini for JSON matching the app's schema instead of relying on prompt instructions alone.")
+        serve_similar_plans = st.checkbox("Serve similar cached plans", value=False, key="serve_similar_plans", help="Reuse an earlier plan when a request differs only cosmetically (wording, a few dollars, 'NYC' vs 'New York').")
+        similar_threshold = st.slider("Similarity threshold", min_value=0.5, max_value=1.0, value=DEFAULT_THRESHOLD, step=0.01, key="similar_threshold", disabled=not serve_similar_plans, help="How closely your suggestions must match an earlier request's. Higher is stricter.")
+        speculative_prefetch = st.checkbox("Prefetch plans while I adjust preferences", value=False, key="speculative_prefetch", disabled=not use_response_cache, help="Once your preferences stop changing for a moment, start generating that plan in the background so Generate can show it immediately. Uses extra Gemini calls.")
+        if speculative_prefetch and "plan_prefetcher" in st.session_state:
+            prefetch_stats = st.session_state.plan_prefetcher.stats()
+            st.caption(f"Prefetch: {prefetch_stats['completed']} ready · {prefetch_stats['cancelled']} cancelled · {prefetch_stats['remaining']} left this session")
+        cache_stats = response_cache.stats()
+        st.caption(f"Cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits · {cache_stats['misses']} misses · {cache_stats['entries']} entries")
+        flight_stats = in_flight.stats()
+        if flight_stats["followers"]:
+            st.caption(f"Coalesced: {flight_stats['followers']} requests joined an identical call in flight")
+        similar_stats = similar_plan_index.stats()
+        if similar_stats["lookups"]:
+            st.caption(f"Similar plans: {similar_stats['hits']} served of {similar_stats['lookups']} lookups · {similar_stats['avg_lookup_ms']} ms avg")
+        client_stats = client_registry.stats()
+        st.caption(f"Clients: {client_stats['hits']} reused · {client_stats['misses']} created")
+        library_stats = surprise_library.stats()
+        if library_stats["entries"]:
+            st.caption(f"Surprise library: {library_stats['entries']} pre-generated · {library_stats['stale']} stale")
+        venue_stats = plan_store.venue_stats()
+        if venue_stats["venues"]:
+            st.caption(f"Known venues: {venue_stats['venues']} across {venue_stats['cities']} cities")
+        limiter_stats = rate_limiter.stats()
+        if limiter_stats["queued"] or limiter_stats["shed"]:
+            st.caption(f"Rate limiter: {limiter_stats['queued']} calls queued ({limiter_stats['avg_wait_s']}s avg wait) · {limiter_stats['shed']} turned away")
+        router_stats = routing_stats()
+        if router_stats["hedged"]:
+            st.caption(f"Hedging: {router_stats['hedged']} slow calls hedged · {router_stats['backup_wins']} won by the backup model")
+        paused_models = open_circuits()
+        if paused_models:
+            st.caption(f"Paused after repeated failures: {', '.join(paused_models)}")
+        call_summary = llm_call_summary()
+        if call_summary:
+            st.caption("Gemini calls (recent, seconds)")
+            st.table(call_summary)
+    if plan_store.enabled:
+        with st.expander("📚 Saved plans"):
+            saved_plans_panel(api_key_input, structured_output, use_response_cache)
 
 left_column, right_column = st.columns([0.42, 0.58])
 
-with left_column:
+with right_column:
+    st.markdown("<div class='right-column-content-wrapper'>", unsafe_allow_html=True)
+    st.markdown("<h2 class='right-column-subheader'>💡 Your Personalized Date Night Idea 💡</h2>", unsafe_allow_html=True)
+    live_plan_placeholder = st.empty()
+
+def show_partial_plan(partial_plan):
+    live_plan_placeholder.markdown(render_partial_plan_html(partial_plan), unsafe_allow_html=True)
+
+# --- Fragments ---
+# Each section reruns on its own when one of its widgets changes; anything that
+# changes another section's content (a new plan or itinerary) calls st.rerun()
+# for a full run.
+
+@st.fragment
+def preferences_panel(api_key, model_name):
     st.markdown("<p class='left-column-section-title'>Your Preferences</p>", unsafe_allow_html=True)
     
-    themes = ["Romantic ❤️", "Fun 🎉", "Chill 🧘", "Adventure 🚀", "Artsy 🎨", "Homebody 🏡", "Intellectual 🧠", "Foodie 🍲", "Mysterious 🕵️", "Nostalgic 🕰️"]
-    activity_types = ["At Home 🏠", "Out (Casual)🚶", "Out (Fancy)👗", "Outdoor Adventure 🌳", "Creative/DIY 🎨", "Learning Together 📚", "Volunteer/Give Back 🤝", "Relax & Unwind 🛀"]
-    prep_time_options = ["30 minutes", "2 hours", "8 hours", "1 day", "1 week", "1 month"]
-    planning_style_options = ["Planning Together", "Planning For Her"]
+    themes = THEMES
+    activity_types = ACTIVITY_TYPES
+    prep_time_options = PREP_TIME_OPTIONS
+    planning_style_options = PLANNING_STYLE_OPTIONS
 
     # Theme with lock
     col_theme_input, col_theme_lock = st.columns([0.85, 0.15], gap="small")
@@ -1038,259 +416,152 @@ with left_column:
     # Location input with toggle
     col_location_input, col_location_toggle = st.columns([0.85, 0.15], gap="small")
     with col_location_input:
-        closest_city = st.text_input("Closest City", 
+        st.text_input("Closest City", 
                                     placeholder="e.g., New York, Los Angeles, Austin", 
                                     help="Enter your closest city for specific local recommendations",
                                     key="city_input")
     with col_location_toggle:
-        include_location = st.checkbox("📍", key="include_location", help="Include this location in the search")
-    
-    planning_style_prompt_line = ""
-    if selected_planning_style == "Planning Together":
-        planning_style_prompt_line = "The user is planning this date collaboratively with their significant other."
-    elif selected_planning_style == "Planning For Her":
-        planning_style_prompt_line = "The user is planning this date as a surprise or gift for their female significant other."
-    
-    # Add location information to prompt if enabled
-    location_prompt_line = ""
-    if include_location and closest_city.strip():
-        location_prompt_line = f"The user is close to {closest_city} so find specific activities and dinners in that area."
+        st.checkbox("📍", key="include_location", help="Include this location in the search")
     
     st.markdown("<p class='left-column-section-title'>Additional Information</p>", unsafe_allow_html=True)
-    user_custom_input = st.text_area(label="Any Suggestions or Restrictions?", height=75, placeholder="e.g., loves Mexican food, allergic to cats, must be indoors, surprise me!", help="Must-haves, must-nots, or specific ideas?", key="user_custom_input_area_v2")
+    st.text_area(label="Any Suggestions or Restrictions?", height=75, placeholder="e.g., loves Mexican food, allergic to cats, must be indoors, surprise me!", help="Must-haves, must-nots, or specific ideas?", key="user_custom_input_area_v2")
+    prefetch_plan(api_key, model_name)
+
+@st.fragment
+def plan_view():
+    plan_data = st.session_state.generated_plan_content
+    st.markdown(plan_html(plan_data), unsafe_allow_html=True)
+
+@st.fragment
+def modification_box(api_key, model_name, delta_mode, structured_output, use_cache):
+    st.markdown("<hr style='margin: 2rem 0; opacity: 0.3;'>", unsafe_allow_html=True)
+    st.markdown("<p class='plan-section-title' style='text-align: center;'>🔧 Want to modify this plan?</p>", unsafe_allow_html=True)
+
+    col_addition_text, col_addition_button = st.columns([3, 1])
+    with col_addition_text:
+        addition_input = st.text_input(
+            "Add a new element to your date", 
+            placeholder="e.g., add alcohol, make it more budget-friendly, include live music, add dessert...",
+            key="addition_input"
+        )
+    with col_addition_button:
+        if st.button("🔄 Make Addition", type="secondary", use_container_width=True, key="make_addition_btn"):
+            if addition_input.strip() and api_key and model_name:
+                preferences = current_preferences()
+                original_plan = st.session_state.generated_plan_content
+                def generate_addition_on(addition_model, _on_partial, on_queue):
+                    # Create a modified prompt that includes the original plan and the addition
+                    return generate_date_plan_with_addition(
+                        api_key, addition_model,
+                        original_plan=original_plan,
+                        addition=addition_input,
+                        theme=preferences["theme"], 
+                        activity_type=preferences["activity_type"],
+                        budget_dollars=preferences["budget_dollars"],
+                        prep_time_text=preferences["prep_time_text"],
+                        time_budget_hours=preferences["time_budget_hours"],
+                        planning_style_prompt_line=preferences["planning_style_prompt_line"],
+                        location_prompt_line=preferences["location_prompt_line"],
+                        delta_mode=delta_mode,
+                        structured_output=structured_output,
+                        on_queue=on_queue,
+                        use_cache=use_cache
+                    )
+                with st.spinner("🔄 Updating your date plan..."):
+                    modified_plan_output, addition_model = generate_with_routing(
+                        "addition", model_name, generate_addition_on, on_queue=queue_indicator()
+                    )
+                show_new_plan(modified_plan_output, api_key, addition_model, structured_output, use_cache, addition=addition_input)
+                st.rerun()
+            elif not addition_input.strip():
+                st.error("Please enter what you'd like to add to the plan.")
+
+@st.fragment
+def itinerary_view():
+    # The itinerary was started in the background as soon as the plan was parsed; collect it here
+    itinerary_job = st.session_state.get('itinerary_job')
+    if itinerary_job is not None and not st.session_state.get('detailed_itinerary'):
+        st.session_state.detailed_itinerary = wait_for_job(itinerary_job, "🔍 Creating detailed itinerary...")
+        st.session_state.itinerary_job = None
+        plan_store.save_itinerary(st.session_state.get("current_plan_id"), st.session_state.detailed_itinerary)
+    if st.session_state.get('detailed_itinerary'):
+        st.markdown(itinerary_html(st.session_state.detailed_itinerary), unsafe_allow_html=True)
+
+with left_column:
+    preferences_panel(api_key_input, selected_model)
+    preferences = current_preferences()
     
     if 'generated_plan_content' not in st.session_state: 
         st.session_state.generated_plan_content = {"message": "Let's plan something amazing! Fill in your preferences and click Generate."}
     
+    def generate_plan_on(model_name, on_partial, on_queue):
+        return generate_date_plan_with_gemini(
+            api_key_input, model_name,
+            preferences["theme"], preferences["activity_type"],
+            preferences["budget_dollars"],
+            preferences["prep_time_text"],
+            preferences["user_input"],
+            preferences["time_budget_hours"],
+            preferences["planning_style_prompt_line"],
+            preferences["location_prompt_line"],
+            on_partial=on_partial,
+            structured_output=structured_output,
+            similar_threshold=similar_threshold if serve_similar_plans and use_response_cache else None,
+            on_queue=on_queue,
+            use_cache=use_response_cache
+        )
+
     if st.button("✨ Generate Date Plan ✨", type="primary", use_container_width=True):
         if not api_key_input: st.session_state.generated_plan_content = {"error": "⚠️ Oops! Please enter your Google API Key."}
         elif not selected_model: st.session_state.generated_plan_content = {"error": "⚠️ Please select a Gemini model."}
         else:
             with st.spinner("💖 Crafting your perfect date night..."):
-                plan_output = generate_date_plan_with_gemini(
-                    api_key_input, selected_model,
-                    selected_theme, selected_activity_type,
-                    actual_budget_dollars_val,
-                    selected_prep_time,
-                    user_custom_input,
-                    time_budget_hours_direct,
-                    planning_style_prompt_line,
-                    location_prompt_line
+                plan_output, plan_model = generate_with_routing(
+                    "plan", selected_model, generate_plan_on,
+                    on_partial=show_partial_plan if stream_plan_output else None,
+                    on_queue=queue_indicator(live_plan_placeholder),
                 )
-            st.session_state.generated_plan_content = plan_output
-            st.session_state.detailed_itinerary = None  # Clear any existing itinerary
-            st.session_state.should_generate_itinerary = isinstance(plan_output, dict) and "title" in plan_output
+            live_plan_placeholder.empty()
+            show_new_plan(plan_output, api_key_input, plan_model, structured_output, use_response_cache)
 
     # Check if auto-generation was triggered by Surprise Me button
     if st.session_state.get('auto_generate', False):
         st.session_state.auto_generate = False
-        if api_key_input and selected_model:
+        # Surprise Me examples are pre-generated; serve them instantly and refresh a stale one in the background.
+        warm_entry = surprise_library.lookup(st.session_state.get('surprise_example'), selected_model) if use_response_cache else None
+        if warm_entry:
+            if warm_entry["itinerary"]:
+                st.session_state.generated_plan_content = warm_entry["plan"]
+                st.session_state.detailed_itinerary = warm_entry["itinerary"]
+                st.session_state.itinerary_job = None
+                st.session_state.current_plan_id = None
+            else:
+                show_new_plan(warm_entry["plan"], api_key_input, selected_model, structured_output, use_response_cache)
+            if surprise_library.is_stale(warm_entry):
+                surprise_library.refresh_in_background(api_key_input, selected_model, warm_entry["example"])
+        elif api_key_input and selected_model:
             with st.spinner("💖 Crafting your surprise date night..."):
-                plan_output = generate_date_plan_with_gemini(
-                    api_key_input, selected_model,
-                    selected_theme, selected_activity_type,
-                    actual_budget_dollars_val,
-                    selected_prep_time,
-                    user_custom_input,
-                    time_budget_hours_direct,
-                    planning_style_prompt_line,
-                    location_prompt_line
+                plan_output, plan_model = generate_with_routing(
+                    "plan", selected_model, generate_plan_on,
+                    on_partial=show_partial_plan if stream_plan_output else None,
+                    on_queue=queue_indicator(live_plan_placeholder),
                 )
-            st.session_state.generated_plan_content = plan_output
-            st.session_state.detailed_itinerary = None
-            st.session_state.should_generate_itinerary = isinstance(plan_output, dict) and "title" in plan_output
+            live_plan_placeholder.empty()
+            show_new_plan(plan_output, api_key_input, plan_model, structured_output, use_response_cache)
 
 with right_column:
-    st.markdown("<div class='right-column-content-wrapper'>", unsafe_allow_html=True)
-    st.markdown("<h2 class='right-column-subheader'>💡 Your Personalized Date Night Idea 💡</h2>", unsafe_allow_html=True)
     plan_data = st.session_state.generated_plan_content
     is_initial_placeholder = isinstance(plan_data, dict) and "message" in plan_data and not plan_data.get("error") and not plan_data.get("title")
 
     if is_initial_placeholder:
         st.markdown(f"<p class='plan-initial-message'>{plan_data['message']}</p>", unsafe_allow_html=True)
+    elif isinstance(plan_data, dict):
+        if "error" in plan_data:
+            plan_view()
+        elif "title" in plan_data:
+            plan_view()
+            modification_box(api_key_input, selected_model, patch_additions, structured_output, use_response_cache)
+            itinerary_view()
     else:
-        st.markdown("<div class='date-plan-output-container'>", unsafe_allow_html=True)
-        if isinstance(plan_data, dict):
-            if "error" in plan_data:
-                st.markdown(f"<div class='plan-error-message'>{plan_data['error']}</div>", unsafe_allow_html=True)
-            elif "title" in plan_data:
-                st.markdown(f"<p class='plan-title'>{plan_data.get('title', 'N/A')}</p>", unsafe_allow_html=True)
-                
-                budget_display = f"<b>Budget:</b> ${plan_data.get('budget_dollars', 'N/A')}"
-                meta_parts = [
-                    f"<b>Theme:</b> {plan_data.get('theme', 'N/A')}",
-                    f"<b>Activity:</b> {plan_data.get('activity_type', 'N/A')}",
-                    budget_display,
-                    f"<b>Prep Time:</b> {plan_data.get('prep_time', 'N/A')}",
-                ]
-                if plan_data.get('time_budget_hours'):
-                    meta_parts.append(f"<b>Max Duration:</b> {plan_data.get('time_budget_hours', 'N/A')} hours")
-                if plan_data.get('planning_style') != "Not specified" and plan_data.get('planning_style'):
-                     meta_parts.append(f"<b>Planning Style:</b> {plan_data.get('planning_style')}")
-                
-                meta_html = "<div class='plan-meta-info'>"
-                for i in range(0, len(meta_parts), 2):
-                    line_parts = [part for part in meta_parts[i:i+2] if part]
-                    line = " | ".join(line_parts)
-                    if line: meta_html += line + "<br>"
-                if meta_html.endswith("<br>"): meta_html = meta_html[:-4]
-                meta_html += f"<br><i>(Powered by {plan_data.get('model_used', 'Gemini AI')})</i></div>"
-                st.markdown(meta_html, unsafe_allow_html=True)
-
-                plan_details = plan_data.get('plan_details', {})
-                if any(plan_details.values()):
-                    st.markdown("<p class='plan-section-title'>🎉 The Plan Unveiled:</p>", unsafe_allow_html=True)
-                    if plan_details.get('step_1_title') and plan_details.get('step_1_description'): st.markdown(f"<span class='plan-step-title'>{plan_details['step_1_title']}:</span> <span class='plan-description'>{plan_details['step_1_description']}</span>", unsafe_allow_html=True)
-                    if plan_details.get('step_2_title') and plan_details.get('step_2_description'): st.markdown(f"<span class='plan-step-title'>{plan_details['step_2_title']}:</span> <span class='plan-description'>{plan_details['step_2_description']}</span>", unsafe_allow_html=True)
-                    if plan_details.get('food_drinks_suggestions'): st.markdown(f"<span class='plan-step-title'>🍽️ Food & Drinks:</span> <span class='plan-description'>{plan_details['food_drinks_suggestions']}</span>", unsafe_allow_html=True)
-                    if plan_details.get('ambiance_extras_suggestions'): st.markdown(f"<span class='plan-step-title'>✨ Ambiance & Extras:</span> <span class='plan-description'>{plan_details['ambiance_extras_suggestions']}</span>", unsafe_allow_html=True)
-                
-                tips = plan_data.get('tips_and_considerations', [])
-                if tips and any(tip.strip() for tip in tips):
-                    st.markdown("<p class='plan-section-title'>💡 Pro Tips & Considerations:</p>", unsafe_allow_html=True)
-                    for tip in tips:
-                        if tip.strip(): st.markdown(f"<div class='plan-list-item'>{tip}</div>", unsafe_allow_html=True)
-                
-                # Display emoji story if available
-                if plan_data.get('emoji_story'):
-                    st.markdown("<p class='plan-section-title'>💫 Your Date Night Journey in Emojis:</p>", unsafe_allow_html=True)
-                    
-                    emoji_story = plan_data['emoji_story'].get('story', '')
-                    if emoji_story:
-                        st.markdown(f"<div class='emoji-story-container'>{emoji_story}</div>", unsafe_allow_html=True)
-                    
-                    emoji_description = plan_data['emoji_story'].get('description', '')
-                    if emoji_description:
-                        st.markdown(f"<div class='emoji-story-description'>{emoji_description}</div>", unsafe_allow_html=True)
-                
-                # Generate detailed itinerary if needed
-                if st.session_state.get('should_generate_itinerary', False) and not st.session_state.get('detailed_itinerary'):
-                    with st.spinner("🔍 Creating detailed itinerary..."):
-                        detailed_itinerary_result = generate_detailed_itinerary(
-                            api_key_input, 
-                            selected_model, 
-                            plan_data,
-                            original_user_input=user_custom_input,
-                            location_prompt_line=location_prompt_line,
-                            planning_style_prompt_line=planning_style_prompt_line
-                        )
-                        st.session_state.detailed_itinerary = detailed_itinerary_result
-                        st.session_state.should_generate_itinerary = False
-                        st.rerun()
-                
-                # Add "Make an Addition" section BEFORE the detailed itinerary
-                if not st.session_state.get('detailed_itinerary') or st.session_state.get('should_generate_itinerary', False):
-                    # Show the addition section immediately after the plan if no detailed itinerary yet
-                    st.markdown("<hr style='margin: 2rem 0; opacity: 0.3;'>", unsafe_allow_html=True)
-                    st.markdown("<p class='plan-section-title' style='text-align: center;'>🔧 Want to modify this plan?</p>", unsafe_allow_html=True)
-                    
-                    col_addition_text, col_addition_button = st.columns([3, 1])
-                    with col_addition_text:
-                        addition_input = st.text_input(
-                            "Add a new element to your date", 
-                            placeholder="e.g., add alcohol, make it more budget-friendly, include live music, add dessert...",
-                            key="addition_input"
-                        )
-                    with col_addition_button:
-                        if st.button("🔄 Make Addition", type="secondary", use_container_width=True):
-                            if addition_input.strip() and api_key_input and selected_model:
-                                with st.spinner("🔄 Updating your date plan..."):
-                                    # Create a modified prompt that includes the original plan and the addition
-                                    modified_plan_output = generate_date_plan_with_addition(
-                                        api_key_input, selected_model,
-                                        original_plan=plan_data,
-                                        addition=addition_input,
-                                        theme=selected_theme, 
-                                        activity_type=selected_activity_type,
-                                        budget_dollars=actual_budget_dollars_val,
-                                        prep_time_text=selected_prep_time,
-                                        time_budget_hours=time_budget_hours_direct,
-                                        planning_style_prompt_line=planning_style_prompt_line,
-                                        location_prompt_line=location_prompt_line
-                                    )
-                                st.session_state.generated_plan_content = modified_plan_output
-                                st.session_state.detailed_itinerary = None  # Clear existing itinerary
-                                st.session_state.should_generate_itinerary = isinstance(modified_plan_output, dict) and "title" in modified_plan_output
-                                st.rerun()
-                            elif not addition_input.strip():
-                                st.error("Please enter what you'd like to add to the plan.")
-                
-                # Show detailed itinerary if available
-                if st.session_state.get('detailed_itinerary'):
-                    # If we have detailed itinerary, show addition section again before it
-                    st.markdown("<hr style='margin: 2rem 0; opacity: 0.3;'>", unsafe_allow_html=True)
-                    st.markdown("<p class='plan-section-title' style='text-align: center;'>🔧 Want to modify this plan?</p>", unsafe_allow_html=True)
-                    
-                    col_addition_text2, col_addition_button2 = st.columns([3, 1])
-                    with col_addition_text2:
-                        addition_input2 = st.text_input(
-                            "Add a new element to your date", 
-                            placeholder="e.g., add alcohol, make it more budget-friendly, include live music, add dessert...",
-                            key="addition_input2"
-                        )
-                    with col_addition_button2:
-                        if st.button("🔄 Make Addition", type="secondary", use_container_width=True, key="make_addition_btn2"):
-                            if addition_input2.strip() and api_key_input and selected_model:
-                                with st.spinner("🔄 Updating your date plan..."):
-                                    # Create a modified prompt that includes the original plan and the addition
-                                    modified_plan_output = generate_date_plan_with_addition(
-                                        api_key_input, selected_model,
-                                        original_plan=plan_data,
-                                        addition=addition_input2,
-                                        theme=selected_theme, 
-                                        activity_type=selected_activity_type,
-                                        budget_dollars=actual_budget_dollars_val,
-                                        prep_time_text=selected_prep_time,
-                                        time_budget_hours=time_budget_hours_direct,
-                                        planning_style_prompt_line=planning_style_prompt_line,
-                                        location_prompt_line=location_prompt_line
-                                    )
-                                st.session_state.generated_plan_content = modified_plan_output
-                                st.session_state.detailed_itinerary = None  # Clear existing itinerary
-                                st.session_state.should_generate_itinerary = isinstance(modified_plan_output, dict) and "title" in modified_plan_output
-                                st.rerun()
-                            elif not addition_input2.strip():
-                                st.error("Please enter what you'd like to add to the plan.")
-                    
-                    # Now show the detailed itinerary
-                    st.markdown("<hr class='plan-separator'>", unsafe_allow_html=True)
-                    st.markdown("<p class='plan-section-title' style='font-size: 1.4em; text-align: center; color: #FFD700; margin-bottom: 1.5rem;'>📍 Detailed Itinerary</p>", unsafe_allow_html=True)
-                    
-                    itinerary_data = st.session_state.detailed_itinerary
-                    if "error" in itinerary_data:
-                        st.markdown(f"<div class='plan-error-message'>{itinerary_data['error']}</div>", unsafe_allow_html=True)
-                    else:
-                        if itinerary_data.get('location_note'): st.markdown(f"<div class='plan-description'><b>Note:</b> {itinerary_data['location_note']}</div>", unsafe_allow_html=True)
-                        st.markdown("<p class='plan-section-title'>⏰ Timeline:</p>", unsafe_allow_html=True)
-                        for item in itinerary_data.get('timeline', []):
-                            st.markdown(f"<div class='plan-step-title'>{item.get('time', 'TBD')} - {item.get('activity', 'Activity')}</div>", unsafe_allow_html=True)
-                            st.markdown(f"<div class='plan-description'><b>📍 Location:</b> {item.get('location', 'TBD')}</div>", unsafe_allow_html=True)
-                            if item.get('address'): st.markdown(f"<div class='plan-description'><b>🏠 Address:</b> {item.get('address')}</div>", unsafe_allow_html=True)
-                            st.markdown(f"<div class='plan-description'>{item.get('details', '')}</div>", unsafe_allow_html=True)
-                            if item.get('booking_required'):
-                                booking_text = f"<b>📅 Booking Required</b>"
-                                if item.get('booking_link'): booking_text += f" - <a href='{item['booking_link']}' target='_blank'>Make Reservation</a>"
-                                st.markdown(f"<div class='plan-description'>{booking_text}</div>", unsafe_allow_html=True)
-                            if item.get('cost_estimate'): st.markdown(f"<div class='plan-description'><b>💰 Cost:</b> {item['cost_estimate']}</div>", unsafe_allow_html=True)
-                            if item.get('parking'): st.markdown(f"<div class='plan-description'><b>🚗 Parking:</b> {item['parking']}</div>", unsafe_allow_html=True)
-                            if item.get('tips'):
-                                for tip_item in item['tips']: st.markdown(f"<div class='plan-list-item'>{tip_item}</div>", unsafe_allow_html=True) # Renamed inner loop var
-                            st.markdown("<br>", unsafe_allow_html=True)
-                        
-                        if itinerary_data.get('backup_options'):
-                            st.markdown("<p class='plan-section-title'>🔄 Backup Options:</p>", unsafe_allow_html=True)
-                            for backup in itinerary_data['backup_options']:
-                                st.markdown(f"<div class='plan-step-title'>Alternative for {backup.get('for_activity', 'Activity')}: {backup.get('alternative', 'TBD')}</div>", unsafe_allow_html=True)
-                                st.markdown(f"<div class='plan-description'><b>Why:</b> {backup.get('reason', '')}</div>", unsafe_allow_html=True)
-                                st.markdown(f"<div class='plan-description'>{backup.get('details', '')}</div>", unsafe_allow_html=True)
-                        
-                        if itinerary_data.get('transportation_notes'): st.markdown(f"<div class='plan-description'><b>🚕 Transportation:</b> {itinerary_data['transportation_notes']}</div>", unsafe_allow_html=True)
-                        if itinerary_data.get('total_estimated_cost'): st.markdown(f"<div class='plan-description'><b>💵 Total Estimated Cost:</b> {itinerary_data['total_estimated_cost']}</div>", unsafe_allow_html=True)
-                        if itinerary_data.get('weather_contingency'): st.markdown(f"<div class='plan-description'><b>🌧️ Weather Contingency:</b> {itinerary_data['weather_contingency']}</div>", unsafe_allow_html=True)
-                        if itinerary_data.get('special_considerations'):
-                            st.markdown("<p class='plan-section-title'>⚠️ Special Considerations:</p>", unsafe_allow_html=True)
-                            for consideration in itinerary_data['special_considerations']: st.markdown(f"<div class='plan-list-item'>{consideration}</div>", unsafe_allow_html=True)
-        else:
-            st.markdown(f"<p class='plan-description'>{str(plan_data)}</p>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True) # End date-plan-output-container
-    st.markdown("</div>", unsafe_allow_html=True) # End right-column-content-wrapper
\ No newline at end of file
+        st.markdown(f"<p class='plan-description'>{str(plan_data)}</p>", unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True) # End right-column-content-wrapper
@@ -0,0 +1,389 @@
+"""Date plan generation shared by the Streamlit app and the command-line tools.
+
+Holds the preference options, the prompt-line helpers and the three generator
+functions (plan, addition, detailed itinerary). Nothing here touches
+Streamlit, so the functions can run headless or from background threads.
+"""
+from itinerary_sections import generate_sectioned_itinerary, sections_fit
+from llm_gateway import generate_json
+from plan_cache import cached_generation
+from plan_patch import apply_merge_patch, without_lists
+from plan_schemas import RESPONSE_SCHEMAS
+from plan_store import plan_store
+from prompt_budget import compact_json, compact_prompt
+from similar_plans import similar_plan_index
+from venues import fill_known_venues, venue_prompt_line
+
+THEMES = ["Romantic ❤️", "Fun 🎉", "Chill 🧘", "Adventure 🚀", "Artsy 🎨", "Homebody 🏡", "Intellectual 🧠", "Foodie 🍲", "Mysterious 🕵️", "Nostalgic 🕰️"]
+ACTIVITY_TYPES = ["At Home 🏠", "Out (Casual)🚶", "Out (Fancy)👗", "Outdoor Adventure 🌳", "Creative/DIY 🎨", "Learning Together 📚", "Volunteer/Give Back 🤝", "Relax & Unwind 🛀"]
+PREP_TIME_OPTIONS = ["30 minutes", "2 hours", "8 hours", "1 day", "1 week", "1 month"]
+PLANNING_STYLE_OPTIONS = ["Planning Together", "Planning For Her"]
+
+
+def planning_style_prompt_line_for(planning_style):
+    """Prompt line describing who is planning the date."""
+    if planning_style == "Planning Together":
+        return "The user is planning this date collaboratively with their significant other."
+    if planning_style == "Planning For Her":
+        return "The user is planning this date as a surprise or gift for their female significant other."
+    return ""
+
+
+def location_prompt_line_for(include_location, city):
+    """Prompt line pointing the model at the user's city, if one should be used."""
+    if include_location and city.strip():
+        return f"The user is close to {city} so find specific activities and dinners in that area."
+    return ""
+
+
+@cached_generation("itinerary")
+def generate_detailed_itinerary(api_key, selected_model_name, original_plan, 
+                                original_user_input=None, location_prompt_line=None,
+                                planning_style_prompt_line=None, structured_output=True, sectioned=False, city=""):
+    """Generate a detailed itinerary based on the original plan and user input.
+
+    With sectioned=True a short skeleton is generated first and its sections
+    concurrently (see itinerary_sections), unless the rate limiter has no room
+    for the extra calls right now; then the single call is used. Given the user's city, the venues
+    already known there are offered to the model (see venues), and the
+    itinerary's own venues are remembered for next time."""
+    if not api_key:
+        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
+    if not selected_model_name:
+        return {"error": "Please select a Gemini model in the sidebar."}
+    known_venues = plan_store.known_venues(city)
+    try:
+        if sectioned and sections_fit(api_key, selected_model_name):
+            itinerary = generate_sectioned_itinerary(
+                api_key, selected_model_name, original_plan, original_user_input,
+                location_prompt_line, planning_style_prompt_line, structured_output,
+                city=city, known_venues=known_venues,
+            )
+            return _with_known_venues(itinerary, city, known_venues)
+        prompt = compact_prompt(f"""
+        You are a creative and helpful date night planning assistant. 
+        You have already provided a date plan, and now the user wants a MORE DETAILED itinerary with ACTUAL places and activities.
+        
+        CRITICALLY IMPORTANT: The user's original custom input contained specific timing and activity preferences that MUST be incorporated:
+        User's Original Input: "{original_user_input if original_user_input else 'None'}"
+        
+        {planning_style_prompt_line if planning_style_prompt_line else ""}
+        {location_prompt_line if location_prompt_line else ""}
+        {venue_prompt_line(city, known_venues)}
+        
+        Original Plan Details:
+        {compact_json(original_plan, "itinerary")}
+        
+        IMPORTANT: Now create a DETAILED ITINERARY that:
+        1. MUST incorporate any specific timing mentioned in the user's original input (e.g., "start at 5pm", "dinner at 7", etc.)
+        2. MUST include any specific activities or venues mentioned by the user
+        3. Provides specific timings for each activity (respecting user's timing preferences)
+        4. Suggests ACTUAL restaurant names, venues, or activity locations (search the internet for real places)
+        5. Includes addresses when possible
+        6. Notes reservation requirements or booking links if applicable
+        7. Offers backup options for each activity
+        8. Estimates driving/transportation time between locations
+        9. Includes specific menu recommendations if applicable
+        10. Provides parking information if relevant
+        
+        If the user hasn't specified a location, suggest activities that could work in any major city, or note that they should specify their location for more accurate recommendations.
+        
+        **IMPORTANT INSTRUCTION:**
+        Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+        The JSON object should follow this structure:
+        
+        {{
+          "title": "{original_plan.get('title', 'Date Night')} - Detailed Itinerary",
+          "location_note": "[If no specific location was mentioned, note this and suggest general options]",
+          "timeline": [
+            {{
+              "time": "6:00 PM",
+              "activity": "Main Activity Name",
+              "location": "Specific Venue Name",
+              "address": "123 Main St, City, State",
+              "details": "Detailed description of what to do here",
+              "booking_required": true/false,
+              "booking_link": "website.com/reservations (if applicable)",
+              "cost_estimate": "$XX per person",
+              "duration": "1.5 hours",
+              "parking": "Street parking available / Valet available / Free lot",
+              "tips": ["Tip 1", "Tip 2"]
+            }}
+          ],
+          "backup_options": [
+            {{
+              "for_activity": "Main Activity Name",
+              "alternative": "Alternative Venue Name",
+              "reason": "Why this is a good backup",
+              "details": "Brief description"
+            }}
+          ],
+          "transportation_notes": "Estimated 15 min drive between venues, consider Uber if drinking",
+          "total_estimated_cost": "$XXX for two people",
+          "special_considerations": ["Consideration 1", "Consideration 2"],
+          "weather_contingency": "If weather is bad, consider..."
+        }}
+        
+        Make sure to search for REAL places and provide ACTUAL recommendations, not generic placeholders.
+        """)
+        
+        response_schema = RESPONSE_SCHEMAS["itinerary"] if structured_output else None
+        itinerary = generate_json(api_key, selected_model_name, prompt, response_schema=response_schema, flow="itinerary")
+        return _with_known_venues(itinerary, city, known_venues)
+    except Exception as e: 
+        return {"error": f"An error occurred: {e}"}
+
+
+def _with_known_venues(itinerary, city, known_venues):
+    """Fill in the details the model left out for known venues, and remember the venues of a complete itinerary."""
+    if isinstance(itinerary, dict) and "error" not in itinerary:
+        fill_known_venues(itinerary, known_venues)
+        if not itinerary.get("incomplete"):
+            plan_store.record_venues(city, itinerary)
+    return itinerary
+
+
+def _addition_output_instructions(delta_mode, selected_model_name, theme, activity_type,
+                                  budget_dollars, prep_time_text, time_budget_hours,
+                                  actual_planning_style_for_json):
+    """Response format section of the addition prompt: a merge patch, or the full plan."""
+    if delta_mode:
+        return """**IMPORTANT INSTRUCTION:**
+        Your response MUST be a single, valid JSON object containing ONLY the fields of the ORIGINAL PLAN that change (a JSON merge patch).
+        - Include nested objects (plan_details, emoji_story) with only their changed keys.
+        - If tips_and_considerations changes, give the complete new list.
+        - Leave out everything that stays the same, including the preference fields (theme, budget, prep time...).
+        - Only update emoji_story if the addition changes the journey of the date.
+        
+        Example response for "add dessert":
+        {
+          "plan_details": {"food_drinks_suggestions": "[Updated food/drinks including dessert]"},
+          "tips_and_considerations": ["[Tip 1]", "[New dessert tip]"]
+        }"""
+    return f"""**IMPORTANT INSTRUCTION:**
+        Your response MUST be a single, valid JSON object following the same structure as the original.
+        Update the relevant fields to reflect the addition while keeping as much of the original plan intact as possible.
+        
+        {{
+          "title": "[Updated title if needed, or keep original]",
+          "theme": "{theme}",
+          "activity_type": "{activity_type}",
+          "budget_dollars": {budget_dollars},
+          "prep_time": "{prep_time_text}",
+          "time_budget_hours": {time_budget_hours},
+          "planning_style": "{actual_planning_style_for_json}",
+          "model_used": "{selected_model_name}",
+          "emoji_story": {{
+            "story": "[Updated emoji story reflecting the addition]",
+            "description": "[Updated description of the emoji journey]"
+          }},
+          "plan_details": {{
+            "step_1_title": "[Update if needed to incorporate addition]",
+            "step_1_description": "[Update if needed to incorporate addition]",
+            "step_2_title": "[Update if needed to incorporate addition]",
+            "step_2_description": "[Update if needed to incorporate addition]",
+            "food_drinks_suggestions": "[Update if addition relates to food/drinks]",
+            "ambiance_extras_suggestions": "[Update if addition relates to ambiance/extras]"
+          }},
+          "tips_and_considerations": [
+            "[Update tips to reflect the addition]",
+            "[Add new tip if needed]"
+          ]
+        }}"""
+
+
+@cached_generation("addition")
+def generate_date_plan_with_addition(api_key, selected_model_name,
+                                    original_plan, addition,
+                                    theme, activity_type,
+                                    budget_dollars, prep_time_text,
+                                    time_budget_hours,
+                                    planning_style_prompt_line,
+                                    location_prompt_line=None,
+                                    delta_mode=True,
+                                    structured_output=True,
+                                    on_queue=None):
+    """Generate a modified date plan that incorporates user's addition while staying close to original.
+
+    In delta_mode the model returns only the changed fields as a JSON merge patch,
+    which is applied to original_plan locally. on_queue receives the call's
+    place in the rate-limit queue while it waits."""
+    if not api_key:
+        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
+    if not selected_model_name:
+        return {"error": "Please select a Gemini model in the sidebar."}
+    try:
+        time_budget_line = f"- Maximum Activity Duration: {time_budget_hours} hours." if time_budget_hours is not None else ""
+        
+        actual_planning_style_for_json = "Not specified"
+        if planning_style_prompt_line:
+            parts = planning_style_prompt_line.split(': ', 1)
+            if len(parts) > 1:
+                actual_planning_style_for_json = parts[1].strip()
+
+        output_instructions = _addition_output_instructions(
+            delta_mode, selected_model_name, theme, activity_type, budget_dollars,
+            prep_time_text, time_budget_hours, actual_planning_style_for_json
+        )
+
+        prompt = compact_prompt(f"""
+        You are a creative and helpful date night planning assistant.
+        The user has already received a date plan and now wants to MODIFY it by adding a specific element.
+        Your goal is to update the existing plan while keeping it as similar as possible to the original.
+        
+        ORIGINAL PLAN:
+        {compact_json(original_plan, "addition")}
+        
+        USER'S ADDITION REQUEST: "{addition}"
+        
+        CRITICAL INSTRUCTIONS:
+        1. Keep the plan as close to the original as possible
+        2. Incorporate the user's addition seamlessly into the existing plan
+        3. Maintain the same theme, budget constraints, and overall structure
+        4. Only change what's necessary to accommodate the addition
+        5. If the addition conflicts with the budget, suggest budget-friendly ways to include it
+        
+        {planning_style_prompt_line}
+        {location_prompt_line if location_prompt_line else ""}
+        
+        Original Preferences (for reference):
+        - Theme: {theme}
+        - Activity Type: {activity_type}
+        - Budget: ${budget_dollars}
+        - Preparation Time: {prep_time_text}
+        {time_budget_line}
+        
+        {output_instructions}
+        """)
+        
+        if delta_mode:
+            patch = generate_json(api_key, selected_model_name, prompt,
+                                  response_schema=RESPONSE_SCHEMAS["addition_patch"] if structured_output else None,
+                                  flow="addition", on_queue=on_queue)
+            if "error" in patch:
+                return patch
+            incomplete = patch.pop("incomplete", False)
+            if incomplete:
+                patch = without_lists(patch)  # A salvaged list may be missing its last items
+            updated_plan = apply_merge_patch(original_plan, patch)
+            updated_plan.update({
+                "theme": theme,
+                "activity_type": activity_type,
+                "budget_dollars": budget_dollars,
+                "prep_time": prep_time_text,
+                "time_budget_hours": time_budget_hours,
+                "planning_style": actual_planning_style_for_json,
+                "model_used": selected_model_name,
+            })
+            if incomplete:
+                updated_plan["incomplete"] = True  # Shown, but never cached or stored as complete
+            return updated_plan
+
+        response_schema = RESPONSE_SCHEMAS["addition"] if structured_output else None
+        return generate_json(api_key, selected_model_name, prompt, response_schema=response_schema, flow="addition",
+                             on_queue=on_queue)
+    except Exception as e: return {"error": f"An error occurred: {e}"}
+
+
+@cached_generation("plan")
+def generate_date_plan_with_gemini(api_key, selected_model_name,
+                                   theme, activity_type,
+                                   budget_dollars, prep_time_text, user_input,
+                                   time_budget_hours,
+                                   planning_style_prompt_line,
+                                   location_prompt_line=None,
+                                   on_partial=None,
+                                   structured_output=True,
+                                   similar_threshold=None,
+                                   on_queue=None,
+                                   cancel=None):
+    """Generate a date plan. If on_partial is given, the response is streamed and
+    on_partial is called with each newly completed prefix of the plan JSON.
+    If similar_threshold is given, an earlier plan for a near-identical request
+    is returned instead of calling the model. on_queue receives the call's
+    place in the rate-limit queue while it waits. Setting the cancel event
+    abandons the call (see llm_gateway.generate_json)."""
+    if not api_key:
+        return {"error": "Google API Key is missing. Please enter it in the sidebar."}
+    if not selected_model_name:
+        return {"error": "Please select a Gemini model in the sidebar."}
+    request_fields = {
+        "theme": theme, "activity_type": activity_type, "budget_dollars": budget_dollars,
+        "prep_time_text": prep_time_text, "user_input": user_input, "time_budget_hours": time_budget_hours,
+        "planning_style_prompt_line": planning_style_prompt_line, "location_prompt_line": location_prompt_line,
+    }
+    if similar_threshold is not None:
+        match = similar_plan_index.find(selected_model_name, request_fields, similar_threshold)
+        if match:
+            similar_plan, _score = match
+            similar_plan["budget_dollars"] = budget_dollars
+            return similar_plan
+    try:
+        time_budget_line = f"- Maximum Activity Duration: {time_budget_hours} hours." if time_budget_hours is not None else ""
+        
+        actual_planning_style_for_json = "Not specified"
+        if planning_style_prompt_line:
+            parts = planning_style_prompt_line.split(': ', 1)
+            if len(parts) > 1:
+                actual_planning_style_for_json = parts[1].strip()
+
+        prompt = compact_prompt(f"""
+        You are a creative and helpful date night planning assistant.
+        Your goal is to generate a fun and suitable date night plan based on the user's preferences.
+        The user is utilizing the '{selected_model_name}' model.
+        {planning_style_prompt_line}
+        {location_prompt_line if location_prompt_line else ""}
+
+        User Preferences:
+        - Theme: {theme}
+        - Activity Type: {activity_type}
+        - Budget: ${budget_dollars} (The user has exactly ${budget_dollars} to spend on this date)
+        - Preparation Time Available: {prep_time_text} (The user wants something that can be prepared within {prep_time_text})
+        {time_budget_line}
+        - User's specific suggestions or restrictions: "{user_input if user_input else 'None'}"
+
+
+        **IMPORTANT INSTRUCTION:**
+        Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+        The JSON object should follow this structure:
+
+        {{
+          "title": "[Catchy Date Night Title - concise, max 5-7 words]",
+          "theme": "{theme}",
+          "activity_type": "{activity_type}",
+          "budget_dollars": {budget_dollars},
+          "prep_time": "{prep_time_text}",
+          "time_budget_hours": {time_budget_hours},
+          "planning_style": "{actual_planning_style_for_json}",
+          "model_used": "{selected_model_name}",
+          "emoji_story": {{
+            "story": "[A long string of emojis telling the emotional journey of the date - should be 20-40 emojis that capture the progression, emotions, activities, and moments]",
+            "description": "[Brief explanation of what the emoji story represents]"
+          }},
+          "plan_details": {{
+            "step_1_title": "[Concise title for Step 1]",
+            "step_1_description": "[Concise description for Step 1, 1-2 sentences]",
+            "step_2_title": "[Concise title for Step 2]",
+            "step_2_description": "[Concise description for Step 2, 1-2 sentences]",
+            "food_drinks_suggestions": "[Optional: Very concise food/drinks. 1 sentence max.]",
+            "ambiance_extras_suggestions": "[Optional: Very concise ambiance/extras. 1 sentence max.]"
+          }},
+          "tips_and_considerations": [
+            "[Very Concise Tip 1, max 1 sentence]",
+            "[Very Concise Tip 2 (if applicable), max 1 sentence]"
+          ]
+        }}
+
+        For emoji_story, tell the date as a mini emotional movie in emojis: anticipation, getting ready, the activities, food and drinks, emotional highs, and the ending.
+        
+        Ensure all string values within the JSON are extremely concise and to the point. Brevity is key.
+        If a time budget is provided, suggest activities that fit within that duration.
+        """)
+        response_schema = RESPONSE_SCHEMAS["plan"] if structured_output else None
+        plan = generate_json(api_key, selected_model_name, prompt, on_partial=on_partial,
+                             response_schema=response_schema, flow="plan", on_queue=on_queue,
+                             cancel=cancel)
+        if isinstance(plan, dict) and "error" not in plan and not plan.get("incomplete"):
+            similar_plan_index.add(selected_model_name, request_fields, plan)
+        return plan
+    except Exception as e: return {"error": f"An error occurred: {e}"}
@@ -0,0 +1,16 @@
+"""The Gemini models the app offers, with everything it needs to know per model.
+
+The sidebar lists them in this order. The rate limiter sizes its buckets from
+the free-tier quotas (requests and tokens per minute), and the router uses
+the capability tier and typical latency to pick a model per flow.
+"""
+
+GEMINI_MODELS = {
+    "gemini-2.5-pro-preview-05-06": {"rpm": 5, "tpm": 250_000, "quality": 3, "typical_latency_s": 25.0},
+    "gemini-2.5-flash-preview-04-17": {"rpm": 10, "tpm": 250_000, "quality": 2, "typical_latency_s": 8.0},
+    "gemini-1.5-flash-latest": {"rpm": 15, "tpm": 1_000_000, "quality": 1, "typical_latency_s": 4.0},
+    "gemini-1.5-pro-latest": {"rpm": 2, "tpm": 32_000, "quality": 2, "typical_latency_s": 12.0},
+    "gemini-1.0-pro": {"rpm": 15, "tpm": 32_000, "quality": 1, "typical_latency_s": 6.0},
+}
+AVAILABLE_MODELS = list(GEMINI_MODELS)
+DEFAULT_MODEL = "gemini-2.5-flash-preview-04-17"
@@ -0,0 +1,236 @@
+"""Sectioned itinerary generation.
+
+A single itinerary call spends most of its time writing output. In sectioned
+mode the model first writes a short skeleton: the timeline slots with time,
+activity, venue and duration. Then each slot's details, the backup options
+and the logistics are requested concurrently, each with the skeleton as
+context. The results are merged into the usual itinerary shape, so the wall
+time is the skeleton plus the slowest section rather than the sum of them all.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_gateway import generate_json
+from plan_schemas import RESPONSE_SCHEMAS, SKELETON_SLOT_FIELDS
+from prompt_budget import compact_json, compact_prompt
+from rate_limiter import rate_limiter
+from venues import find_venue, venue_details, venue_prompt_line
+
+SECTION_WORKERS = int(os.getenv("DATENIGHT_SECTION_WORKERS", 16))
+MAX_TIMELINE_SLOTS = 8
+# Skeleton, one group of slot details, backups and logistics.
+MIN_SECTION_CALLS = 4
+
+# Sections get their own pool: the itinerary itself usually runs on a background
+# job, which must never wait on a pool it occupies.
+_section_pool = ThreadPoolExecutor(max_workers=SECTION_WORKERS, thread_name_prefix="datenight-section")
+
+
+def _context(original_plan, original_user_input, location_prompt_line, planning_style_prompt_line):
+    return f"""
+    You are a creative and helpful date night planning assistant.
+    You have already provided a date plan, and now the user wants a MORE DETAILED itinerary with ACTUAL places and activities.
+    The user's original custom input contained specific timing and activity preferences that MUST be respected:
+    User's Original Input: "{original_user_input if original_user_input else 'None'}"
+    {planning_style_prompt_line if planning_style_prompt_line else ""}
+    {location_prompt_line if location_prompt_line else ""}
+
+    Original Plan Details:
+    {compact_json(original_plan, "itinerary")}
+    """
+
+
+def skeleton_prompt(original_plan, context, known_venues_line=""):
+    return compact_prompt(f"""
+    {context}
+    {known_venues_line}
+    Write the ITINERARY SKELETON only: the ordered timeline slots, without descriptions, tips or costs.
+    The slots MUST:
+    1. Incorporate any specific timing mentioned in the user's original input (e.g., "start at 5pm", "dinner at 7")
+    2. Include any specific activities or venues mentioned by the user
+    3. Name ACTUAL restaurants, venues or activity locations (real places, not generic placeholders)
+    4. Give every slot a start time and a duration that fit the date
+
+    If the user hasn't specified a location, use places that could work in any major city and say so in location_note.
+
+    **IMPORTANT INSTRUCTION:**
+    Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+    {{
+      "title": "{original_plan.get('title', 'Date Night')} - Detailed Itinerary",
+      "location_note": "[If no specific location was mentioned, note this and suggest general options]",
+      "timeline": [
+        {{"time": "6:00 PM", "activity": "Main Activity Name", "location": "Specific Venue Name", "duration": "1.5 hours"}}
+      ]
+    }}
+    """)
+
+
+def _slot_line(timeline, index, known_venues):
+    slot = timeline[index]
+    line = (f"Slot {index + 1}: {slot.get('time')} - {slot.get('activity')} at {slot.get('location')}"
+            f" ({slot.get('duration')}).")
+    known_venue = find_venue(known_venues, slot.get("location"))
+    if known_venue:
+        line += (f" This venue is already known ({venue_details(known_venue)}): leave out its address, parking and"
+                 " booking_link, they are filled in from what is known.")
+    return line
+
+
+def slot_group_prompt(context, timeline, indexes, known_venues=()):
+    slot_lines = "\n".join(_slot_line(timeline, index, known_venues) for index in indexes)
+    return compact_prompt(f"""
+    {context}
+    The itinerary's timeline is already fixed:
+    {compact_json(timeline)}
+
+    Write the TIMELINE SLOT DETAILS for these slots only, one entry per slot in this order:
+    {slot_lines}
+    Do not change their times, activities or venues. For each, include the real address, what to do there (with specific
+    menu recommendations if applicable), whether booking is required and the booking link, a cost estimate, parking and tips.
+
+    **IMPORTANT INSTRUCTION:**
+    Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+    {{
+      "slots": [
+        {{
+          "address": "123 Main St, City, State",
+          "details": "Detailed description of what to do here",
+          "booking_required": true/false,
+          "booking_link": "website.com/reservations (if applicable)",
+          "cost_estimate": "$XX per person",
+          "parking": "Street parking available / Valet available / Free lot",
+          "tips": ["Tip 1", "Tip 2"]
+        }}
+      ]
+    }}
+    """)
+
+
+def backups_prompt(context, timeline):
+    return compact_prompt(f"""
+    {context}
+    The itinerary's timeline is already fixed:
+    {compact_json(timeline)}
+
+    Write the BACKUP OPTIONS only: one real alternative venue or activity for each slot, in case it is full, closed or rained out.
+
+    **IMPORTANT INSTRUCTION:**
+    Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+    {{
+      "backup_options": [
+        {{"for_activity": "Main Activity Name", "alternative": "Alternative Venue Name", "reason": "Why this is a good backup", "details": "Brief description"}}
+      ]
+    }}
+    """)
+
+
+def logistics_prompt(context, timeline):
+    return compact_prompt(f"""
+    {context}
+    The itinerary's timeline is already fixed:
+    {compact_json(timeline)}
+
+    Write the LOGISTICS only: transportation between the venues (with estimated travel times), the total cost for two,
+    special considerations and a weather contingency.
+
+    **IMPORTANT INSTRUCTION:**
+    Your response MUST be a single, valid JSON object. Do NOT include any text outside of this JSON object.
+    {{
+      "transportation_notes": "Estimated 15 min drive between venues, consider Uber if drinking",
+      "total_estimated_cost": "$XXX for two people",
+      "special_considerations": ["Consideration 1", "Consideration 2"],
+      "weather_contingency": "If weather is bad, consider..."
+    }}
+    """)
+
+
+def sections_fit(api_key, model_name):
+    """True if the rate limiter can admit a minimal sectioned itinerary right away.
+
+    Sections all share the caller's (key, model) lane; on a small quota they
+    would queue or be shed, and the single-call itinerary is faster.
+    """
+    headroom = rate_limiter.headroom(api_key, model_name)
+    return headroom is None or headroom >= MIN_SECTION_CALLS
+
+
+def slot_groups(slot_count, headroom):
+    """Slot indexes split into contiguous groups, one call each: one slot per call when
+    the lane has room for them all next to backups and logistics, fewer, larger groups otherwise."""
+    group_count = slot_count if headroom is None else max(1, min(slot_count, headroom - 2))
+    size, extra = divmod(slot_count, group_count)
+    groups, start = [], 0
+    for group in range(group_count):
+        end = start + size + (group < extra)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def _per_slot(group_result, size):
+    """A slot group's response as one details dict per slot; slots it left out count as failed."""
+    if "error" in group_result:
+        return [group_result] * size
+    slots = [slot for slot in group_result.get("slots") or [] if isinstance(slot, dict)][:size]
+    if group_result.get("incomplete"):
+        slots = [dict(slot, incomplete=True) for slot in slots]
+    return slots + [{"error": "The model left this slot out."}] * (size - len(slots))
+
+
+def _is_complete(section):
+    return isinstance(section, dict) and "error" not in section and not section.get("incomplete")
+
+
+def merge_sections(skeleton, slot_details, backups, logistics):
+    """The itinerary assembled from its sections. Sections that failed are left out
+    and the itinerary is marked incomplete, so it is shown but never cached."""
+    itinerary = {"title": skeleton.get("title"), "location_note": skeleton.get("location_note", "")}
+    timeline = []
+    for slot, details in zip(skeleton.get("timeline") or [], slot_details):
+        item = {key: value for key, value in details.items() if key not in ("error", "incomplete")}
+        item.update({field: slot.get(field) for field in SKELETON_SLOT_FIELDS})
+        timeline.append(item)
+    itinerary["timeline"] = timeline
+    if "error" not in backups:
+        itinerary["backup_options"] = backups.get("backup_options") or []
+    if "error" not in logistics:
+        itinerary.update({key: value for key, value in logistics.items() if key != "incomplete"})
+    if not all(_is_complete(section) for section in (skeleton, backups, logistics, *slot_details)):
+        itinerary["incomplete"] = True
+    return itinerary
+
+
+def generate_sectioned_itinerary(api_key, selected_model_name, original_plan, original_user_input=None,
+                                 location_prompt_line=None, planning_style_prompt_line=None, structured_output=True,
+                                 city="", known_venues=()):
+    """Skeleton first, then the slot details, backups and logistics concurrently, merged into one itinerary.
+
+    Slot details are grouped so the whole fan-out fits the rate limiter's free
+    capacity for this key and model (see slot_groups). known_venues (from the
+    plan store) are offered to the skeleton; a slot at a known venue is asked
+    only for the details that are not known yet."""
+    context = _context(original_plan, original_user_input, location_prompt_line, planning_style_prompt_line)
+
+    def section(prompt, schema_name, flow="itinerary_section"):
+        schema = RESPONSE_SCHEMAS[schema_name] if structured_output else None
+        try:
+            return generate_json(api_key, selected_model_name, prompt, response_schema=schema, flow=flow)
+        except Exception as e:
+            return {"error": f"An error occurred: {e}"}
+
+    known_venues_line = venue_prompt_line(city, known_venues, omit_known_details=False)
+    skeleton = section(skeleton_prompt(original_plan, context, known_venues_line), "itinerary_skeleton",
+                       flow="itinerary_skeleton")
+    if "error" in skeleton:
+        return skeleton
+    timeline = (skeleton.get("timeline") or [])[:MAX_TIMELINE_SLOTS]
+    skeleton["timeline"] = timeline
+
+    groups = slot_groups(len(timeline), rate_limiter.headroom(api_key, selected_model_name)) if timeline else []
+    group_jobs = [_section_pool.submit(section, slot_group_prompt(context, timeline, group, known_venues),
+                                       "itinerary_slots")
+                  for group in groups]
+    backups_job = _section_pool.submit(section, backups_prompt(context, timeline), "itinerary_backups")
+    logistics_job = _section_pool.submit(section, logistics_prompt(context, timeline), "itinerary_logistics")
+    slot_details = [details for group, job in zip(groups, group_jobs) for details in _per_slot(job.result(), len(group))]
+    return merge_sections(skeleton, slot_details, backups_job.result(), logistics_job.result())
@@ -0,0 +1,64 @@
+"""Process-wide registry of Gemini model clients.
+
+``genai.configure`` sets a process-global API key, so building a model per call
+meant reconfiguring the SDK and constructing a new ``GenerativeModel`` on every
+request of every session. The registry builds each (api_key, model_name) pair
+once, pins it to the client for that key and hands the same object back on
+later calls, across reruns and sessions. The SDK itself is imported on the
+first model request, not when the app starts, since it is the slowest import
+in the process.
+"""
+import hashlib
+import threading
+
+
+def key_fingerprint(api_key):
+    """Short stable id for an API key, so raw keys stay out of dict keys and stats."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _pin_client(model):
+    """Bind the model to the client of the currently configured key.
+
+    GenerativeModel otherwise resolves the default client lazily on its first
+    call, which could pick up a key another session configured in the meantime.
+    """
+    try:
+        from google.generativeai import client as genai_client
+        model._client = genai_client.get_default_generative_client()
+    except (ImportError, AttributeError):
+        pass
+
+
+class ClientRegistry:
+    """Thread-safe cache of GenerativeModel objects keyed by (api_key, model_name)."""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._configured_key = None
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get_model(self, api_key, model_name):
+        registry_key = (key_fingerprint(api_key), model_name)
+        with self._lock:
+            model = self._models.get(registry_key)
+            if model is not None:
+                self._stats["hits"] += 1
+                return model
+            self._stats["misses"] += 1
+            import google.generativeai as genai
+            if self._configured_key != registry_key[0]:
+                genai.configure(api_key=api_key)
+                self._configured_key = registry_key[0]
+            model = genai.GenerativeModel(model_name=model_name)
+            _pin_client(model)
+            self._models[registry_key] = model
+            return model
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, clients=len(self._models))
+
+
+client_registry = ClientRegistry()
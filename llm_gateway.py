@@ -0,0 +1,398 @@
+"""Single entry point for Gemini calls made by the generator functions.
+
+``generate_json`` sends a prompt, extracts the response text, strips code
+fences and parses the JSON object. Around that it enforces a per-call
+deadline, retries transient provider errors with jittered exponential backoff
+and keeps a circuit breaker per model so a failing model fails fast instead of
+holding script runs hostage. Every attempt first waits its turn in the
+per-key, per-model rate limiter. Failures come back as ``{"error": ...}`` dicts,
+like everywhere else in the app; only a cancelled call raises.
+"""
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from llm_clients import client_registry, key_fingerprint
+from llm_telemetry import record_call
+from partial_json import parse_partial, repair_json, strip_code_fence
+from prompt_budget import INPUT_TOKEN_BUDGETS, estimate_tokens, measure_prompt_tokens
+from rate_limiter import EXPECTED_OUTPUT_TOKENS, MAX_QUEUE_WAIT_SECONDS, QueueFull, rate_limiter
+
+CALL_TIMEOUT_SECONDS = float(os.getenv("DATENIGHT_CALL_TIMEOUT", 60))
+TOTAL_DEADLINE_SECONDS = float(os.getenv("DATENIGHT_TOTAL_DEADLINE", 120))
+# An exact token count is only a refinement of the local estimate; don't wait long for it.
+COUNT_TOKENS_TIMEOUT_SECONDS = 5.0
+MAX_ATTEMPTS = int(os.getenv("DATENIGHT_MAX_ATTEMPTS", 3))
+MAX_CONTINUATIONS = 2
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 8.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 30.0
+
+
+class GenerationCancelled(BaseException):
+    """Raised when a call's cancel event is set. Like asyncio.CancelledError it is a
+    BaseException, so the generators' catch-all error handling lets it through."""
+
+
+def _check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled()
+
+
+@functools.lru_cache(maxsize=None)
+def provider_errors():
+    """Exception classes by kind (rate_limit, timeout, server, invalid_request, transient).
+
+    Resolved on the first call rather than at import: api_core pulls in grpc,
+    which would otherwise slow every cold start.
+    """
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:  # api_core ships with google-generativeai; degrade to stdlib errors without it
+        errors = {"rate_limit": (), "timeout": (TimeoutError,), "server": (ConnectionError,), "invalid_request": ()}
+    else:
+        errors = {
+            "rate_limit": (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests),
+            "timeout": (google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout, TimeoutError),
+            "server": (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError, ConnectionError),
+            "invalid_request": (google_exceptions.InvalidArgument,),
+        }
+    errors["transient"] = errors["rate_limit"] + errors["timeout"] + errors["server"]
+    return errors
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through per cooldown."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown_seconds=BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """(allowed, is_probe): whether a call may go out, and whether it is the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False, False
+            self._probing = True
+            return True, True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Give the probe slot back when the probe ended without a verdict on the model."""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (time.monotonic() - self._opened_at))
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+# (key fingerprint, model) pairs whose calls rejected response_schema (older models
+# only follow the prompt). Keyed per API key so one bad request cannot turn schemas
+# off for everyone.
+_schema_unsupported = set()
+# Words an InvalidArgument about the schema itself contains; a bad key or any
+# other bad request must not disable schemas.
+SCHEMA_ERROR_MARKERS = ("schema", "mime_type", "mime type")
+
+
+def _rejects_schema(error):
+    message = str(error).lower()
+    return any(marker in message for marker in SCHEMA_ERROR_MARKERS)
+
+
+def breaker_for(model_name):
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker()
+        return _breakers[model_name]
+
+
+def open_circuits():
+    """Names of models whose circuit is currently open."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return sorted(name for name, breaker in breakers.items() if breaker.is_open)
+
+
+def response_text(response):
+    """Text of a generate_content response (streamed responses must be fully consumed)."""
+    if hasattr(response, 'text'):
+        return response.text
+    if isinstance(response, str):
+        return response
+    if hasattr(response, 'parts') and response.parts:
+        return "".join(part.text for part in response.parts if hasattr(part, 'text'))
+    raise ValueError(f"Unexpected response format from API: {str(response)}")
+
+
+def was_truncated(response):
+    """True if generation stopped because it hit the output token limit."""
+    try:
+        finish_reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(finish_reason, "name", finish_reason) in ("MAX_TOKENS", 2)
+
+
+def parse_json_text(raw_text_response):
+    """Parse model output into a dict, or an error dict describing why it failed.
+
+    Output that is not strictly valid goes through repair_json. Objects that
+    could only be partly recovered are returned with ``"incomplete": True``.
+    """
+    cleaned = strip_code_fence(raw_text_response)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        parse_error = e
+    repaired, complete = repair_json(raw_text_response)
+    if isinstance(repaired, dict) and repaired:
+        if not complete:
+            repaired["incomplete"] = True
+        return repaired
+    return {"error": f"Failed to parse JSON. Error: {parse_error}. Raw (first 500 chars): '{raw_text_response[:500]}...'"}
+
+
+def continuation_prompt(prompt, partial_text):
+    """Prompt asking the model to finish a response that was cut off."""
+    return (
+        f"{prompt}\n\n"
+        "Your previous response to the request above was cut off. This is what you wrote so far:\n"
+        f"{partial_text}\n\n"
+        "Continue EXACTLY where it stops. Output only the remaining characters of the JSON object, "
+        "without repeating anything already written and without code fences."
+    )
+
+
+def _stream_text(response, on_partial, deadline, call_stats, cancel=None):
+    """Consume a streamed response, calling on_partial whenever more of the JSON is complete."""
+    streamed_text = ""
+    last_partial = None
+    for chunk in response:
+        _check_cancelled(cancel)
+        if time.monotonic() > deadline:
+            raise TimeoutError("Gemini stream exceeded its deadline")
+        try:
+            chunk_text = chunk.text
+        except ValueError:  # Chunk without text parts (e.g. safety metadata only)
+            continue
+        if not chunk_text:
+            continue
+        if call_stats["ttft"] is None:
+            call_stats["ttft"] = time.monotonic() - call_stats["started"]
+        streamed_text += chunk_text
+        partial = parse_partial(strip_code_fence(streamed_text))
+        if partial and partial != last_partial:
+            last_partial = partial
+            on_partial(partial)
+    return response
+
+
+def _add_usage(call_stats, response):
+    """Add the response's token counts to call_stats and return their total, if known."""
+    usage = getattr(response, "usage_metadata", None)
+    total = None
+    for stat, field in (("prompt_tokens", "prompt_token_count"), ("output_tokens", "candidates_token_count")):
+        count = getattr(usage, field, None)
+        if count is not None:
+            call_stats[stat] = (call_stats[stat] or 0) + count
+            total = (total or 0) + count
+    return total
+
+
+def _call_once(api_key, model_name, prompt, on_partial, deadline, response_schema, call_stats, on_queue=None,
+               cancel=None):
+    """One generate_content call, admitted by the rate limiter; returns (text, truncated)."""
+    _check_cancelled(cancel)
+    reserved = rate_limiter.acquire(api_key, model_name, estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS,
+                                    on_queue, max_wait=min(MAX_QUEUE_WAIT_SECONDS, deadline - time.monotonic()),
+                                    cancel=cancel)
+    _check_cancelled(cancel)  # Cancelled while queued: acquire gave up its place without taking a request
+    call_stats["attempts"] += 1
+    model = client_registry.get_model(api_key, model_name)
+    timeout = max(1.0, min(CALL_TIMEOUT_SECONDS, deadline - time.monotonic()))
+    request_options = {"timeout": timeout}
+    generation_config = None
+    if response_schema is not None:
+        generation_config = {"response_mime_type": "application/json", "response_schema": response_schema}
+    if on_partial is not None:
+        response = model.generate_content(prompt, stream=True, generation_config=generation_config,
+                                          request_options=request_options)
+        response = _stream_text(response, on_partial, time.monotonic() + timeout, call_stats, cancel)
+    else:
+        response = model.generate_content(prompt, generation_config=generation_config, request_options=request_options)
+    rate_limiter.settle(api_key, model_name, reserved, _add_usage(call_stats, response))
+    return response_text(response), was_truncated(response)
+
+
+def _continue_truncated(api_key, model_name, prompt, raw_text_response, deadline, call_stats):
+    """Ask the model to finish a cut-off response instead of regenerating it."""
+    for _ in range(MAX_CONTINUATIONS):
+        if time.monotonic() >= deadline:
+            break
+        try:
+            more_text, truncated = _call_once(
+                api_key, model_name, continuation_prompt(prompt, raw_text_response), None, deadline, None, call_stats
+            )
+        except Exception:
+            break  # Keep what we have; parse_json_text salvages the prefix.
+        raw_text_response += strip_code_fence(more_text)
+        if not truncated:
+            break
+    return raw_text_response
+
+
+def _backoff_delay(attempt):
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)].
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def generate_json(api_key, model_name, prompt, on_partial=None, response_schema=None, flow=None, on_queue=None,
+                  cancel=None):
+    """Send a prompt to Gemini and return its JSON object as a dict.
+
+    If on_partial is given the response is streamed and on_partial receives
+    each newly completed prefix of the object. If response_schema is given the
+    model is asked for schema-constrained JSON; a model that rejects the schema
+    is remembered for that API key and falls back to prompt-only JSON. Prompts
+    over the flow's input token budget are refused before anything is sent. on_queue is
+    passed to the rate limiter to report the call's place in line. Setting the
+    cancel event (a threading.Event) stops the call between attempts or
+    streamed chunks by raising GenerationCancelled. The deadline covers the
+    whole call, including the token count for the budget check.
+    """
+    started = time.monotonic()
+    budget = INPUT_TOKEN_BUDGETS.get(flow)
+    if budget is not None:
+        prompt_tokens = measure_prompt_tokens(client_registry.get_model(api_key, model_name), prompt, budget,
+                                              timeout=min(COUNT_TOKENS_TIMEOUT_SECONDS, TOTAL_DEADLINE_SECONDS))
+        if prompt_tokens > budget:
+            return {"error": f"⚠️ This request is too long ({prompt_tokens} tokens, limit {budget}). "
+                             "Please shorten your suggestions or addition and try again."}
+    if (key_fingerprint(api_key), model_name) in _schema_unsupported:
+        response_schema = None
+    breaker = breaker_for(model_name)
+    allowed, is_probe = breaker.allow()
+    if not allowed:
+        return {"error": f"⚠️ {model_name} is failing repeatedly, so requests are paused for "
+                         f"{math.ceil(breaker.retry_after())}s. Try again shortly or pick another model."}
+
+    call_stats = {"started": started, "attempts": 0, "ttft": None,
+                  "prompt_tokens": None, "output_tokens": None, "outcome": None}
+    try:
+        result = _generate_with_retries(api_key, model_name, prompt, on_partial, response_schema, breaker,
+                                        call_stats, on_queue, cancel)
+    except BaseException as e:
+        # Cancelled, or interrupted by a Streamlit rerun or stop raised from on_partial or on_queue.
+        record_call(flow, model_name, "api_error" if isinstance(e, Exception) else "cancelled",
+                    time.monotonic() - call_stats["started"],
+                    time_to_first_token=call_stats["ttft"], prompt_tokens=call_stats["prompt_tokens"],
+                    output_tokens=call_stats["output_tokens"], attempts=call_stats["attempts"])
+        raise
+    finally:
+        # A probe that ended without recording a success or failure (shed, rate
+        # limited, cancelled, interrupted) must not keep the circuit half-open forever.
+        if is_probe:
+            breaker.release_probe()
+    outcome = call_stats["outcome"] or ("api_error" if "error" in result else "ok")
+    record_call(flow, model_name, outcome, time.monotonic() - call_stats["started"],
+                time_to_first_token=call_stats["ttft"], prompt_tokens=call_stats["prompt_tokens"],
+                output_tokens=call_stats["output_tokens"], attempts=call_stats["attempts"])
+    return result
+
+
+def _generate_with_retries(api_key, model_name, prompt, on_partial, response_schema, breaker, call_stats,
+                           on_queue=None, cancel=None):
+    deadline = call_stats["started"] + TOTAL_DEADLINE_SECONDS
+    errors = provider_errors()
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            raw_text_response, truncated = _call_once(
+                api_key, model_name, prompt, on_partial, deadline, response_schema, call_stats, on_queue, cancel
+            )
+        except QueueFull as e:
+            # Shedding is the limiter's decision, not the model's failure.
+            call_stats["outcome"] = "shed"
+            return {"error": f"⚠️ So many date nights are being planned that {model_name} is fully booked "
+                             f"({e.waiting_ahead} requests ahead of yours). Please try again in a minute."}
+        except errors["invalid_request"] as e:
+            if response_schema is None or not _rejects_schema(e):
+                breaker.record_success()
+                return {"error": f"An error occurred: {e}"}
+            last_error = e
+            _schema_unsupported.add((key_fingerprint(api_key), model_name))
+            response_schema = None
+            continue
+        except errors["transient"] as e:
+            last_error = e
+            if isinstance(e, errors["rate_limit"]):
+                # Quota belongs to the API key, not the model: pause the key's lane
+                # in the limiter instead of the model's circuit for every user.
+                rate_limiter.exhausted(api_key, model_name)
+            else:
+                breaker.record_failure()
+            delay = _backoff_delay(attempt)
+            if attempt + 1 >= MAX_ATTEMPTS or breaker.is_open or time.monotonic() + delay >= deadline:
+                break
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+            continue
+        except Exception as e:
+            # Not worth retrying (bad key, invalid argument, blocked prompt...). The model
+            # itself answered, so this does not count against its circuit.
+            breaker.record_success()
+            return {"error": f"An error occurred: {e}"}
+        breaker.record_success()
+        if truncated:
+            raw_text_response = _continue_truncated(
+                api_key, model_name, prompt, raw_text_response, deadline, call_stats
+            )
+        parsed = parse_json_text(raw_text_response)
+        if "error" in parsed:
+            call_stats["outcome"] = "parse_error"
+        return parsed
+
+    if isinstance(last_error, errors["rate_limit"]):
+        call_stats["outcome"] = "rate_limited"
+        return {"error": "⚠️ Gemini is rate limiting requests right now. Please wait a moment and try again."}
+    if isinstance(last_error, errors["transient"]):
+        call_stats["outcome"] = "provider_error"  # Timeouts and server errors: the model's fault, not the caller's
+    if isinstance(last_error, errors["timeout"]):
+        return {"error": f"⚠️ {model_name} did not answer in time. Please try again or pick a faster model."}
+    return {"error": f"An error occurred: {last_error}"}
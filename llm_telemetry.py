@@ -0,0 +1,105 @@
+"""Per-call telemetry for Gemini requests.
+
+The gateway records one entry per ``generate_json`` call: flow, model, wall
+time, time to first token when streaming, prompt/output token counts from
+``usage_metadata`` and the outcome: ``ok``, ``parse_error``, ``provider_error``
+(timeouts and server errors), ``rate_limited``, ``shed``, ``cancelled`` or
+``api_error`` (anything else, such as an invalid key or request).
+Entries are appended to a rotating JSONL log and kept in a bounded in-memory
+window that feeds the sidebar's p50/p95 table.
+"""
+import json
+import logging
+import logging.handlers
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Set DATENIGHT_TELEMETRY_LOG to an empty string to disable the JSONL log.
+TELEMETRY_LOG_PATH = os.getenv("DATENIGHT_TELEMETRY_LOG", os.path.join(".datenight", "llm_calls.jsonl"))
+TELEMETRY_LOG_MAX_BYTES = 5 * 1024 * 1024
+TELEMETRY_LOG_BACKUPS = 3
+RECENT_WINDOW = 1000
+
+_recent = deque(maxlen=RECENT_WINDOW)
+_lock = threading.Lock()
+_logger = logging.getLogger("datenight.llm_calls")
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+
+
+def _ensure_log_handler():
+    if _logger.handlers or not TELEMETRY_LOG_PATH:
+        return
+    try:
+        os.makedirs(os.path.dirname(TELEMETRY_LOG_PATH) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            TELEMETRY_LOG_PATH, maxBytes=TELEMETRY_LOG_MAX_BYTES, backupCount=TELEMETRY_LOG_BACKUPS, encoding="utf-8"
+        )
+    except OSError:
+        return
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+
+
+def record_call(flow, model, outcome, wall_time, time_to_first_token=None,
+                prompt_tokens=None, output_tokens=None, attempts=1):
+    """Store one call's measurements in memory and in the JSONL log."""
+    entry = {
+        "ts": round(time.time(), 3),
+        "flow": flow or "unknown",
+        "model": model,
+        "outcome": outcome,
+        "wall_time_s": round(wall_time, 3),
+        "ttft_s": round(time_to_first_token, 3) if time_to_first_token is not None else None,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "attempts": attempts,
+    }
+    with _lock:
+        _recent.append(entry)
+        _ensure_log_handler()
+    _logger.info(json.dumps(entry, ensure_ascii=False))
+    return entry
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values, or None if there are none."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+def summary():
+    """Rows of call counts, p50/p95 latency and failures per (model, flow) over the recent window."""
+    with _lock:
+        entries = list(_recent)
+    groups = {}
+    for entry in entries:
+        groups.setdefault((entry["model"], entry["flow"]), []).append(entry)
+    rows = []
+    for (model, flow), group in sorted(groups.items()):
+        wall_times = sorted(entry["wall_time_s"] for entry in group)
+        ttfts = sorted(entry["ttft_s"] for entry in group if entry["ttft_s"] is not None)
+        output_tokens = [entry["output_tokens"] for entry in group if entry["output_tokens"] is not None]
+        rows.append({
+            "model": model,
+            "flow": flow,
+            "calls": len(group),
+            "p50_s": percentile(wall_times, 0.50),
+            "p95_s": percentile(wall_times, 0.95),
+            "ttft_p50_s": percentile(ttfts, 0.50),
+            "avg_out_tokens": round(sum(output_tokens) / len(output_tokens)) if output_tokens else None,
+            "parse_errors": sum(1 for entry in group if entry["outcome"] == "parse_error"),
+            "api_errors": sum(1 for entry in group
+                              if entry["outcome"] in ("api_error", "provider_error", "rate_limited")),
+        })
+    return rows
+
+
+def recent_calls():
+    with _lock:
+        return list(_recent)
@@ -0,0 +1,161 @@
+"""Latency-aware model routing and hedged requests.
+
+The router ranks the available models for a flow from recent call
+telemetry. Models whose circuit is open or whose recent error rate is too
+high are skipped, and so are models below the flow's quality floor. The rest
+are ordered by their median latency for that flow, with a prior standing in
+for models that have too few recent calls. A hedged call starts on the best
+model and, if that model has not answered within its p90 for the flow, sends
+the same request to the runner-up and takes the first valid JSON.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from gemini_models import GEMINI_MODELS
+from llm_gateway import open_circuits
+from llm_telemetry import percentile, recent_calls
+
+# A flow is only routed to models whose capability tier ("quality") is at or above its floor.
+QUALITY_FLOORS = {"plan": 2, "addition": 1, "itinerary": 2}
+DEFAULT_QUALITY = 1
+# Seconds per call assumed for a model without a typical latency, until it has MIN_SAMPLES recent calls.
+DEFAULT_PRIOR_LATENCY_SECONDS = 10.0
+HEALTH_WINDOW_SECONDS = 15 * 60
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = 0.3
+# Outcomes of calls the model itself answered or failed; the rest (shed, rate
+# limited, cancelled, client errors) are about the caller.
+MODEL_OUTCOMES = ("ok", "parse_error", "provider_error")
+HEDGE_MIN_DELAY_SECONDS = 2.0
+HEDGE_POLL_SECONDS = 0.1
+HEDGE_WORKERS = int(os.getenv("DATENIGHT_HEDGE_WORKERS", 8))
+
+# Hedged attempts get their own pool: callers may themselves be background jobs
+# waiting on them, and must never wait on a pool they occupy.
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="datenight-hedge")
+_stats_lock = threading.Lock()
+_stats = {"routed": 0, "hedged": 0, "backup_wins": 0}
+
+
+def _quality(model):
+    return GEMINI_MODELS.get(model, {}).get("quality", DEFAULT_QUALITY)
+
+
+def model_health(flow, models):
+    """Recent calls, p50/p90 latency and error rate per model over the health window.
+
+    Latency comes from the flow's successful calls; the error rate counts every
+    flow, since a failing model fails for all of them. Only provider-side
+    failures (timeouts, server errors) count, out of the calls that reached the
+    model: one user's shed requests, exhausted quota or invalid key say nothing
+    about the model's health for everyone else.
+    """
+    cutoff = time.time() - HEALTH_WINDOW_SECONDS
+    calls = [entry for entry in recent_calls() if entry["ts"] >= cutoff]
+    health = {}
+    for model in models:
+        model_calls = [entry for entry in calls if entry["model"] == model]
+        reached = [entry for entry in model_calls if entry["outcome"] in MODEL_OUTCOMES]
+        failures = sum(1 for entry in reached if entry["outcome"] == "provider_error")
+        latencies = sorted(entry["wall_time_s"] for entry in model_calls
+                           if entry["flow"] == flow and entry["outcome"] == "ok")
+        measured = len(latencies) >= MIN_SAMPLES
+        prior = GEMINI_MODELS.get(model, {}).get("typical_latency_s", DEFAULT_PRIOR_LATENCY_SECONDS)
+        health[model] = {
+            "calls": len(model_calls),
+            "p50_s": percentile(latencies, 0.5) if measured else prior,
+            "p90_s": percentile(latencies, 0.9) if measured else 2 * prior,
+            "error_rate": failures / len(reached) if len(reached) >= MIN_SAMPLES else 0.0,
+        }
+    return health
+
+
+def rank_models(flow, models, health=None):
+    """Models for a flow, best first: healthy ones meeting the quality floor by median latency.
+
+    If none qualifies, the floor is kept and health ignored; if nothing meets
+    the floor either, every model is ranked.
+    """
+    health = health or model_health(flow, models)
+    floor = QUALITY_FLOORS.get(flow, 1)
+    paused = set(open_circuits())
+    capable = [model for model in models if _quality(model) >= floor] or list(models)
+    healthy = [model for model in capable
+               if model not in paused and health[model]["error_rate"] <= MAX_ERROR_RATE] or capable
+    return sorted(healthy, key=lambda model: health[model]["p50_s"])
+
+
+def choose_model(flow, models):
+    return rank_models(flow, models)[0]
+
+
+def hedged_call(flow, models, call, on_partial=None):
+    """Run call(model_name, on_partial) on the best model, hedged with the runner-up.
+
+    The primary runs on a worker; if it has not answered within its p90 for
+    the flow (or fails first), the runner-up gets the same request. The first
+    error-free result wins; the loser finishes in the background and still
+    fills the response cache. Streamed partials from the primary are replayed
+    through on_partial on the calling thread. Returns (result, model_name).
+    """
+    health = model_health(flow, models)
+    ranking = rank_models(flow, models, health)
+    primary = ranking[0]
+    backup = ranking[1] if len(ranking) > 1 else None
+    relay = {"partial": None, "version": 0}
+
+    def relay_partial(partial):
+        relay["partial"] = partial
+        relay["version"] += 1
+
+    futures = {_hedge_pool.submit(call, primary, relay_partial if on_partial else None): primary}
+    hedge_at = time.monotonic() + max(HEDGE_MIN_DELAY_SECONDS, health[primary]["p90_s"])
+    seen_version = 0
+    first_failure = None
+    with _stats_lock:
+        _stats["routed"] += 1
+    while futures:
+        timeout = HEDGE_POLL_SECONDS if on_partial else None
+        if backup is not None:
+            until_hedge = max(0.0, hedge_at - time.monotonic())
+            timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+        done, _pending = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            model = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"An error occurred: {e}"}
+            if isinstance(result, dict) and "error" not in result:
+                if model != primary:
+                    with _stats_lock:
+                        _stats["backup_wins"] += 1
+                return result, model
+            first_failure = first_failure or (result, model)
+        if backup is not None and (time.monotonic() >= hedge_at or not futures):
+            futures[_hedge_pool.submit(call, backup, None)] = backup
+            backup = None
+            with _stats_lock:
+                _stats["hedged"] += 1
+        if on_partial and relay["version"] != seen_version:
+            seen_version = relay["version"]
+            on_partial(relay["partial"])
+    return first_failure
+
+
+def routed_call(flow, models, call, hedge=False, on_partial=None):
+    """call(model_name, on_partial) on the best model for the flow, hedged if asked.
+    Returns (result, model_name)."""
+    if hedge:
+        return hedged_call(flow, models, call, on_partial)
+    model = choose_model(flow, models)
+    with _stats_lock:
+        _stats["routed"] += 1
+    return call(model, on_partial), model
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,118 @@
+"""Incremental parsing of JSON objects that are still being streamed.
+
+``parse_partial`` turns the text received so far into a dict containing only
+the values that are already complete, so the UI can render them before the
+model has finished the whole object.
+"""
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def strip_code_fence(text):
+    """Remove a leading ```json fence (and its closing fence) if present."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:].strip()
+    elif text.startswith("```"):
+        text = text[3:].strip()
+    if text.endswith("```"):
+        text = text[:-3].strip()
+    return text
+
+
+def parse_partial(text):
+    """Best-effort parse of an incomplete JSON object.
+
+    Returns the full object once it is complete, otherwise the largest prefix
+    that ends on a value boundary, closed off with the missing brackets.
+    Returns None when nothing usable has arrived yet.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    stack = []
+    in_string = False
+    escaped = False
+    cut = None  # (end index, brackets still open at that point)
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+            cut = (index + 1, list(stack))
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                try:
+                    return json.loads(text[:index + 1])
+                except json.JSONDecodeError:
+                    return None
+            cut = (index + 1, list(stack))
+        elif char == ",":
+            cut = (index, list(stack))
+
+    if cut is None:
+        return None
+    end, open_brackets = cut
+    candidate = text[:end].rstrip().rstrip(",")
+    candidate += "".join(_CLOSERS[bracket] for bracket in reversed(open_brackets))
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+
+
+def _remove_trailing_commas(text):
+    """Drop commas that directly precede a closing bracket (outside strings)."""
+    result = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            while result and result[-1].isspace():
+                result.pop()
+            if result and result[-1] == ",":
+                result.pop()
+        result.append(char)
+    return "".join(result)
+
+
+def repair_json(text):
+    """Salvage a JSON object from slightly malformed or truncated model output.
+
+    Handles prose around the object, trailing commas and unclosed brackets.
+    Returns ``(value, complete)``; ``complete`` is False when only a prefix of
+    the object could be recovered, and value is None when nothing was.
+    """
+    cleaned = _remove_trailing_commas(strip_code_fence(text))
+    start = cleaned.find("{")
+    if start == -1:
+        return None, False
+    try:
+        value, _ = json.JSONDecoder().raw_decode(cleaned[start:])
+        return value, True
+    except json.JSONDecodeError:
+        pass
+    return parse_partial(cleaned[start:]), False
@@ -0,0 +1,247 @@
+"""Response cache shared by the Gemini generator functions.
+
+Keys are built from normalized inputs, so requests that only differ in
+whitespace or casing share an entry. Entries live in an in-memory LRU with a
+TTL and, unless disabled, in a small SQLite file so they survive restarts.
+Identical requests that miss the cache at the same time, from any session,
+share a single in-flight generation.
+"""
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+CACHE_TTL_SECONDS = float(os.getenv("DATENIGHT_CACHE_TTL", 6 * 60 * 60))
+CACHE_MAX_ENTRIES = int(os.getenv("DATENIGHT_CACHE_MAX_ENTRIES", 256))
+# Set DATENIGHT_CACHE_DB to an empty string to keep the cache in memory only.
+CACHE_DB_PATH = os.getenv("DATENIGHT_CACHE_DB", os.path.join(".datenight", "response_cache.sqlite3"))
+
+# Arguments that never change what the model returns.
+UNCACHED_ARGUMENTS = {"api_key", "on_partial", "structured_output", "similar_threshold", "on_queue", "cancel"}
+
+
+def _normalize(value):
+    """Canonical form of a generator argument for key building."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(flow, fields):
+    """Stable hash of a flow name and its normalized inputs."""
+    payload = json.dumps({"flow": flow, "fields": _normalize(fields)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache with an optional SQLite tier."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS, db_path=CACHE_DB_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+                )
+                self._db.commit()
+            except sqlite3.Error:
+                self._db = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT expires_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and row[0] > now:
+                    value = json.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self._stats["disk_hits"] += 1
+                    return copy.deepcopy(value)
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, copy.deepcopy(value))
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, json.dumps(value, ensure_ascii=False)),
+                )
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), disk=self._db is not None)
+
+    def _remember(self, key, expires_at, value):
+        # Caller holds the lock.
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+response_cache = ResponseCache()
+
+
+def is_shareable(result):
+    """Only complete, successful results are cached or handed to other callers. Errors may
+    be specific to the caller (a bad API key, its quota), so others make their own call."""
+    return isinstance(result, dict) and "error" not in result and not result.get("incomplete")
+
+# How often a session waiting on another session's call checks for new partial output.
+FOLLOWER_POLL_SECONDS = 0.1
+_ABANDONED = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.future = Future()
+        self.partial = None
+        self.partial_version = 0
+
+
+class SingleFlight:
+    """Process-wide registry that lets concurrent identical calls share one execution.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight wait on its Future and get a copy of its result if
+    that is shareable. Otherwise they try again, one of them as the new leader.
+    Waiting happens on each caller's own thread, so a follower can replay the
+    leader's streamed partial output through its own on_partial callback.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def run(self, key, call, on_partial=None):
+        """Return call(on_partial) for key, joining an identical call already in flight."""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                self._stats["leaders" if leader else "followers"] += 1
+            if leader:
+                return self._lead(key, flight, call, on_partial)
+            result = self._follow(flight, on_partial)
+            if result is not _ABANDONED:
+                return copy.deepcopy(result)
+            # The leader was interrupted (e.g. its session reran) or failed; try again, possibly as the new leader.
+
+    def _lead(self, key, flight, call, on_partial):
+        def relay(partial):
+            flight.partial = partial
+            flight.partial_version += 1
+            on_partial(partial)
+
+        try:
+            result = call(relay if on_partial else None)
+        except BaseException:
+            flight.future.set_result(_ABANDONED)
+            raise
+        else:
+            flight.future.set_result(result if is_shareable(result) else _ABANDONED)
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _follow(self, flight, on_partial):
+        seen_version = 0
+        while True:
+            try:
+                return flight.future.result(timeout=FOLLOWER_POLL_SECONDS)
+            except FutureTimeoutError:
+                if on_partial and flight.partial_version != seen_version:
+                    seen_version = flight.partial_version
+                    on_partial(flight.partial)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
+
+in_flight = SingleFlight()
+
+
+def cached_generation(flow, cache=None):
+    """Decorator that serves repeat generator calls from the response cache.
+
+    The wrapped function gains a ``use_cache`` keyword (default True); pass
+    False to force a fresh generation that still refreshes the entry. Error
+    dicts and partially recovered responses are never stored. On a miss, the
+    call joins an identical generation already in flight if there is one.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache=True, **kwargs):
+            target = cache if cache is not None else response_cache
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            fields = {name: value for name, value in bound.arguments.items() if name not in UNCACHED_ARGUMENTS}
+            key = make_key(flow, fields)
+            if use_cache:
+                cached = target.get(key)
+                if cached is not None:
+                    return cached
+
+            def generate(on_partial):
+                if "on_partial" in bound.arguments:
+                    bound.arguments["on_partial"] = on_partial
+                result = func(*bound.args, **bound.kwargs)
+                if is_shareable(result):
+                    target.set(key, result)
+                return result
+
+            return in_flight.run(key, generate, bound.arguments.get("on_partial"))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,35 @@
+"""JSON Merge Patch (RFC 7386) support for incremental plan edits.
+
+In delta mode the addition flow asks the model only for the fields it changes
+and merges them into the plan the user already has, instead of having the
+model re-emit the whole plan.
+"""
+import copy
+
+
+def apply_merge_patch(target, patch):
+    """Return a copy of target with an RFC 7386 merge patch applied.
+
+    Objects merge key by key, ``None`` removes a key, and every other value
+    (including lists) replaces the original outright.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def without_lists(patch):
+    """A copy of patch without list values, at any depth.
+
+    A patch salvaged from a cut-off response can end in a list that lost its
+    last items, and merge patches replace lists outright, so merging it would
+    silently shorten the plan's list.
+    """
+    return {key: without_lists(value) if isinstance(value, dict) else value
+            for key, value in patch.items() if not isinstance(value, list)}
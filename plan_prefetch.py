@@ -0,0 +1,89 @@
+"""Speculative plan generation while the user is still adjusting preferences.
+
+Each session keeps one PlanPrefetcher in session_state. Every time the
+preferences change, the session schedules a prefetch for the new request.
+Once the request has stayed the same for the debounce window, the plan is
+generated on a background worker through the normal cached generator, so it
+lands in the response cache. A Generate click with the same inputs is then a
+cache hit, or joins the prefetch while it is still in flight. A newer request
+cancels the previous one, even mid-stream, and every session has a hard cap
+on how many prefetches it may start. Prefetches run on their own small pool
+so speculative work never holds up the background jobs a real click starts.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_gateway import GenerationCancelled
+
+PREFETCH_DEBOUNCE_SECONDS = float(os.getenv("DATENIGHT_PREFETCH_DEBOUNCE", 1.5))
+PREFETCH_MAX_PER_SESSION = int(os.getenv("DATENIGHT_PREFETCH_MAX_PER_SESSION", 5))
+PREFETCH_WORKERS = int(os.getenv("DATENIGHT_PREFETCH_WORKERS", 2))
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="datenight-prefetch")
+
+
+class PlanPrefetcher:
+    """Debounced, cancellable, capped prefetching for one session."""
+
+    def __init__(self, debounce_seconds=PREFETCH_DEBOUNCE_SECONDS, max_prefetches=PREFETCH_MAX_PER_SESSION):
+        self.debounce_seconds = debounce_seconds
+        self.max_prefetches = max_prefetches
+        self._lock = threading.Lock()
+        self._key = None
+        self._timer = None
+        self._cancel = None
+        self._stats = {"started": 0, "completed": 0, "cancelled": 0}
+
+    def schedule(self, key, generate):
+        """Prefetch generate(cancel) for key once key has been stable for the debounce window.
+
+        key identifies the request; scheduling the same key again is a no-op,
+        and a different key cancels whatever was scheduled or running before.
+        generate runs on a background worker, so it must not touch Streamlit.
+        """
+        with self._lock:
+            if key == self._key:
+                return
+            self._cancel_locked()
+            self._key = key
+            if self._stats["started"] >= self.max_prefetches:
+                return
+            cancel = self._cancel = threading.Event()
+            self._timer = threading.Timer(self.debounce_seconds, self._start, (cancel, generate))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_locked()
+            self._key = None
+
+    def _cancel_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._cancel is not None:
+            self._cancel.set()
+            self._cancel = None
+
+    def _start(self, cancel, generate):
+        with self._lock:
+            if cancel.is_set() or self._stats["started"] >= self.max_prefetches:
+                return
+            self._stats["started"] += 1
+        _prefetch_pool.submit(self._run, cancel, generate)
+
+    def _run(self, cancel, generate):
+        try:
+            generate(cancel)
+        except GenerationCancelled:
+            with self._lock:
+                self._stats["cancelled"] += 1
+        else:
+            with self._lock:
+                self._stats["completed"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, remaining=max(0, self.max_prefetches - self._stats["started"]))
@@ -0,0 +1,175 @@
+"""HTML for the plan and itinerary views.
+
+Each view is built as one HTML document and sent with a single
+``st.markdown`` call, instead of one element per step, tip and timeline line.
+Finished documents are memoized by a hash of the content they were built
+from, so a rerun that shows the same plan reuses the string.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+RENDER_CACHE_MAX_ENTRIES = 64
+
+_rendered = OrderedDict()
+_lock = threading.Lock()
+
+
+def _content_hash(kind, data):
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{kind}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _memoized(kind, data, build):
+    key = _content_hash(kind, data)
+    with _lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+    html = build(data)
+    with _lock:
+        _rendered[key] = html
+        while len(_rendered) > RENDER_CACHE_MAX_ENTRIES:
+            _rendered.popitem(last=False)
+    return html
+
+
+def _plan_steps(plan_details):
+    steps = [
+        (plan_details.get('step_1_title'), plan_details.get('step_1_description')),
+        (plan_details.get('step_2_title'), plan_details.get('step_2_description')),
+        ("🍽️ Food & Drinks", plan_details.get('food_drinks_suggestions')),
+        ("✨ Ambiance & Extras", plan_details.get('ambiance_extras_suggestions')),
+    ]
+    return [(title, description) for title, description in steps if title and description]
+
+
+def _emoji_story_html(emoji_story):
+    html_parts = ["<p class='plan-section-title'>💫 Your Date Night Journey in Emojis:</p>"]
+    if emoji_story.get('story'):
+        html_parts.append(f"<div class='emoji-story-container'>{emoji_story['story']}</div>")
+    if emoji_story.get('description'):
+        html_parts.append(f"<div class='emoji-story-description'>{emoji_story['description']}</div>")
+    return "".join(html_parts)
+
+
+def render_partial_plan_html(partial_plan):
+    """HTML for the parts of a plan that have finished streaming so far."""
+    html_parts = ["<div class='date-plan-output-container'>"]
+    if partial_plan.get('title'):
+        html_parts.append(f"<p class='plan-title'>{partial_plan['title']}</p>")
+    steps = _plan_steps(partial_plan.get('plan_details') or {})
+    if steps:
+        html_parts.append("<p class='plan-section-title'>🎉 The Plan Unveiled:</p>")
+        for title, description in steps:
+            html_parts.append(f"<span class='plan-step-title'>{title}:</span> <span class='plan-description'>{description}</span><br>")
+    tips = [tip for tip in partial_plan.get('tips_and_considerations') or [] if isinstance(tip, str) and tip.strip()]
+    if tips:
+        html_parts.append("<p class='plan-section-title'>💡 Pro Tips & Considerations:</p>")
+        html_parts.extend(f"<div class='plan-list-item'>{tip}</div>" for tip in tips)
+    emoji_story = partial_plan.get('emoji_story') or {}
+    if emoji_story.get('story'):
+        html_parts.append(_emoji_story_html(emoji_story))
+    html_parts.append("</div>")
+    return "".join(html_parts)
+
+
+def _build_plan_html(plan_data):
+    if "error" in plan_data:
+        return f"<div class='plan-error-message'>{plan_data['error']}</div>"
+    html_parts = [f"<p class='plan-title'>{plan_data.get('title', 'N/A')}</p>"]
+    if plan_data.get('incomplete'):
+        html_parts.append("<div class='plan-description'><i>Part of this plan was cut off and could not be recovered. Generate again for the full version.</i></div>")
+
+    meta_parts = [
+        f"<b>Theme:</b> {plan_data.get('theme', 'N/A')}",
+        f"<b>Activity:</b> {plan_data.get('activity_type', 'N/A')}",
+        f"<b>Budget:</b> ${plan_data.get('budget_dollars', 'N/A')}",
+        f"<b>Prep Time:</b> {plan_data.get('prep_time', 'N/A')}",
+    ]
+    if plan_data.get('time_budget_hours'):
+        meta_parts.append(f"<b>Max Duration:</b> {plan_data['time_budget_hours']} hours")
+    if plan_data.get('planning_style') and plan_data.get('planning_style') != "Not specified":
+        meta_parts.append(f"<b>Planning Style:</b> {plan_data['planning_style']}")
+    meta_lines = [" | ".join(meta_parts[i:i + 2]) for i in range(0, len(meta_parts), 2)]
+    html_parts.append(
+        f"<div class='plan-meta-info'>{'<br>'.join(meta_lines)}"
+        f"<br><i>(Powered by {plan_data.get('model_used', 'Gemini AI')})</i></div>"
+    )
+
+    steps = _plan_steps(plan_data.get('plan_details') or {})
+    if steps:
+        html_parts.append("<p class='plan-section-title'>🎉 The Plan Unveiled:</p>")
+        for title, description in steps:
+            html_parts.append(f"<div><span class='plan-step-title'>{title}:</span> <span class='plan-description'>{description}</span></div>")
+
+    tips = [tip for tip in plan_data.get('tips_and_considerations') or [] if tip.strip()]
+    if tips:
+        html_parts.append("<p class='plan-section-title'>💡 Pro Tips & Considerations:</p>")
+        html_parts.extend(f"<div class='plan-list-item'>{tip}</div>" for tip in tips)
+
+    if plan_data.get('emoji_story'):
+        html_parts.append(_emoji_story_html(plan_data['emoji_story']))
+    return "".join(html_parts)
+
+
+def _build_itinerary_html(itinerary_data):
+    html_parts = [
+        "<hr class='plan-separator'>",
+        "<p class='plan-section-title' style='font-size: 1.4em; text-align: center; color: #FFD700; margin-bottom: 1.5rem;'>📍 Detailed Itinerary</p>",
+    ]
+    if "error" in itinerary_data:
+        html_parts.append(f"<div class='plan-error-message'>{itinerary_data['error']}</div>")
+        return "".join(html_parts)
+
+    if itinerary_data.get('incomplete'):
+        html_parts.append("<div class='plan-description'><i>Part of this itinerary was cut off and could not be recovered.</i></div>")
+    if itinerary_data.get('location_note'):
+        html_parts.append(f"<div class='plan-description'><b>Note:</b> {itinerary_data['location_note']}</div>")
+    html_parts.append("<p class='plan-section-title'>⏰ Timeline:</p>")
+    for item in itinerary_data.get('timeline', []):
+        html_parts.append(f"<div class='plan-step-title'>{item.get('time', 'TBD')} - {item.get('activity', 'Activity')}</div>")
+        html_parts.append(f"<div class='plan-description'><b>📍 Location:</b> {item.get('location', 'TBD')}</div>")
+        if item.get('address'):
+            html_parts.append(f"<div class='plan-description'><b>🏠 Address:</b> {item['address']}</div>")
+        html_parts.append(f"<div class='plan-description'>{item.get('details', '')}</div>")
+        if item.get('booking_required'):
+            booking_text = "<b>📅 Booking Required</b>"
+            if item.get('booking_link'):
+                booking_text += f" - <a href='{item['booking_link']}' target='_blank'>Make Reservation</a>"
+            html_parts.append(f"<div class='plan-description'>{booking_text}</div>")
+        if item.get('cost_estimate'):
+            html_parts.append(f"<div class='plan-description'><b>💰 Cost:</b> {item['cost_estimate']}</div>")
+        if item.get('parking'):
+            html_parts.append(f"<div class='plan-description'><b>🚗 Parking:</b> {item['parking']}</div>")
+        html_parts.extend(f"<div class='plan-list-item'>{tip}</div>" for tip in item.get('tips') or [])
+        html_parts.append("<br>")
+
+    if itinerary_data.get('backup_options'):
+        html_parts.append("<p class='plan-section-title'>🔄 Backup Options:</p>")
+        for backup in itinerary_data['backup_options']:
+            html_parts.append(f"<div class='plan-step-title'>Alternative for {backup.get('for_activity', 'Activity')}: {backup.get('alternative', 'TBD')}</div>")
+            html_parts.append(f"<div class='plan-description'><b>Why:</b> {backup.get('reason', '')}</div>")
+            html_parts.append(f"<div class='plan-description'>{backup.get('details', '')}</div>")
+
+    if itinerary_data.get('transportation_notes'):
+        html_parts.append(f"<div class='plan-description'><b>🚕 Transportation:</b> {itinerary_data['transportation_notes']}</div>")
+    if itinerary_data.get('total_estimated_cost'):
+        html_parts.append(f"<div class='plan-description'><b>💵 Total Estimated Cost:</b> {itinerary_data['total_estimated_cost']}</div>")
+    if itinerary_data.get('weather_contingency'):
+        html_parts.append(f"<div class='plan-description'><b>🌧️ Weather Contingency:</b> {itinerary_data['weather_contingency']}</div>")
+    if itinerary_data.get('special_considerations'):
+        html_parts.append("<p class='plan-section-title'>⚠️ Special Considerations:</p>")
+        html_parts.extend(f"<div class='plan-list-item'>{consideration}</div>" for consideration in itinerary_data['special_considerations'])
+    return "".join(html_parts)
+
+
+def plan_html(plan_data):
+    """The finished plan (or its error) as one HTML document."""
+    return _memoized("plan", plan_data, _build_plan_html)
+
+
+def itinerary_html(itinerary_data):
+    """The detailed itinerary section (or its error) as one HTML document."""
+    return _memoized("itinerary", itinerary_data, _build_itinerary_html)
@@ -0,0 +1,121 @@
+"""JSON shapes returned by the generator flows and the response schemas derived from them.
+
+Each shape is written once as a nested literal (python types for leaves, a
+one-element list for arrays, ``optional(...)`` for fields the model may omit).
+``RESPONSE_SCHEMAS`` holds the Gemini response schema for every flow, built
+from those shapes a single time at import.
+"""
+
+
+class optional:
+    """Marks a field the model is allowed to leave out."""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+
+PLAN_SHAPE = {
+    "title": str,
+    "theme": str,
+    "activity_type": str,
+    "budget_dollars": int,
+    "prep_time": str,
+    "time_budget_hours": int,
+    "planning_style": str,
+    "model_used": str,
+    "emoji_story": {
+        "story": str,
+        "description": str,
+    },
+    "plan_details": {
+        "step_1_title": str,
+        "step_1_description": str,
+        "step_2_title": str,
+        "step_2_description": str,
+        "food_drinks_suggestions": optional(str),
+        "ambiance_extras_suggestions": optional(str),
+    },
+    "tips_and_considerations": [str],
+}
+
+TIMELINE_ITEM_SHAPE = {
+    "time": str,
+    "activity": str,
+    "location": str,
+    "address": optional(str),
+    "details": str,
+    "booking_required": bool,
+    "booking_link": optional(str),
+    "cost_estimate": str,
+    "duration": str,
+    "parking": optional(str),
+    "tips": [str],
+}
+
+ITINERARY_SHAPE = {
+    "title": str,
+    "location_note": optional(str),
+    "timeline": [TIMELINE_ITEM_SHAPE],
+    "backup_options": [{
+        "for_activity": str,
+        "alternative": str,
+        "reason": str,
+        "details": str,
+    }],
+    "transportation_notes": str,
+    "total_estimated_cost": str,
+    "special_considerations": [str],
+    "weather_contingency": str,
+}
+
+# Sections of a sectioned itinerary: a skeleton of timeline slots first, then
+# the slots' details (in one or more groups), the backup options and the
+# logistics, concurrently.
+SKELETON_SLOT_FIELDS = ("time", "activity", "location", "duration")
+ITINERARY_SKELETON_SHAPE = {
+    "title": str,
+    "location_note": optional(str),
+    "timeline": [{field: TIMELINE_ITEM_SHAPE[field] for field in SKELETON_SLOT_FIELDS}],
+}
+TIMELINE_SLOT_DETAILS_SHAPE = {
+    field: spec for field, spec in TIMELINE_ITEM_SHAPE.items() if field not in SKELETON_SLOT_FIELDS
+}
+ITINERARY_SLOT_GROUP_SHAPE = {"slots": [TIMELINE_SLOT_DETAILS_SHAPE]}
+ITINERARY_BACKUPS_SHAPE = {"backup_options": ITINERARY_SHAPE["backup_options"]}
+ITINERARY_LOGISTICS_SHAPE = {
+    field: ITINERARY_SHAPE[field]
+    for field in ("transportation_notes", "total_estimated_cost", "special_considerations", "weather_contingency")
+}
+
+_SCALAR_TYPES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+
+def schema_for(spec, as_patch=False):
+    """Gemini response schema (OpenAPI subset) for a shape.
+
+    With as_patch=True every object field becomes optional, which describes a
+    merge patch against that shape. Array items stay whole because merge
+    patches replace lists outright.
+    """
+    if isinstance(spec, optional):
+        spec = spec.spec
+    if isinstance(spec, dict):
+        schema = {"type": "OBJECT", "properties": {name: schema_for(field, as_patch) for name, field in spec.items()}}
+        if not as_patch:
+            schema["required"] = [name for name, field in spec.items() if not isinstance(field, optional)]
+        return schema
+    if isinstance(spec, list):
+        return {"type": "ARRAY", "items": schema_for(spec[0])}
+    return {"type": _SCALAR_TYPES[spec]}
+
+
+RESPONSE_SCHEMAS = {
+    "plan": schema_for(PLAN_SHAPE),
+    "addition": schema_for(PLAN_SHAPE),
+    "addition_patch": schema_for(PLAN_SHAPE, as_patch=True),
+    "itinerary": schema_for(ITINERARY_SHAPE),
+    "itinerary_skeleton": schema_for(ITINERARY_SKELETON_SHAPE),
+    "itinerary_slots": schema_for(ITINERARY_SLOT_GROUP_SHAPE),
+    "itinerary_backups": schema_for(ITINERARY_BACKUPS_SHAPE),
+    "itinerary_logistics": schema_for(ITINERARY_LOGISTICS_SHAPE),
+}
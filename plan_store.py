@@ -0,0 +1,258 @@
+"""Persistent store of generated plans, itineraries and addition histories.
+
+Everything a session generates is written to a local SQLite file so it can be
+found again after a reload, or by another user, without calling Gemini. The
+database runs in WAL mode so several app processes can read while one
+writes. Plan and itinerary JSON is stored zlib-compressed; the columns used
+for lookups (theme, activity type, canonical city, budget bucket, model) sit
+next to it and are indexed, so listing queries never decompress anything.
+A plan made with "Make Addition" points at the plan it modified, which gives
+each plan its addition history. The venues table holds what itineraries taught
+the app about each city's venues (see venues).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from similar_plans import canonical_city, canonical_text
+from venues import SHORTLIST_SIZE, VENUE_FIELDS, extract_venues
+
+# Set DATENIGHT_PLAN_STORE to an empty string to disable the store.
+PLAN_STORE_PATH = os.getenv("DATENIGHT_PLAN_STORE", os.path.join(".datenight", "plans.sqlite3"))
+BUDGET_BUCKET_DOLLARS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    model TEXT NOT NULL,
+    theme TEXT,
+    activity_type TEXT,
+    city TEXT NOT NULL DEFAULT '',
+    budget_dollars INTEGER,
+    budget_bucket INTEGER,
+    title TEXT,
+    parent_id INTEGER REFERENCES plans (id),
+    addition TEXT,
+    plan BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS itineraries (
+    plan_id INTEGER PRIMARY KEY REFERENCES plans (id),
+    created_at REAL NOT NULL,
+    itinerary BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS venues (
+    city TEXT NOT NULL,
+    venue_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    address TEXT,
+    cost_estimate TEXT,
+    parking TEXT,
+    booking_link TEXT,
+    seen_count INTEGER NOT NULL DEFAULT 1,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (city, venue_key)
+);
+CREATE INDEX IF NOT EXISTS idx_venues_city_popularity ON venues (city, seen_count DESC, last_seen DESC);
+CREATE INDEX IF NOT EXISTS idx_plans_city_budget ON plans (city, budget_bucket, created_at);
+CREATE INDEX IF NOT EXISTS idx_plans_theme_activity ON plans (theme, activity_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_plans_model ON plans (model, created_at);
+CREATE INDEX IF NOT EXISTS idx_plans_created ON plans (created_at);
+CREATE INDEX IF NOT EXISTS idx_plans_parent ON plans (parent_id);
+"""
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _budget_bucket(budget_dollars):
+    try:
+        return int(budget_dollars) // BUDGET_BUCKET_DOLLARS
+    except (TypeError, ValueError):
+        return None
+
+
+def is_storable(result):
+    """Only complete, successful results are worth keeping."""
+    return isinstance(result, dict) and "title" in result and "error" not in result and not result.get("incomplete")
+
+
+class PlanStore:
+    """Thread-safe SQLite store; every method is a no-op when the store is disabled."""
+
+    def __init__(self, db_path=PLAN_STORE_PATH):
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute("PRAGMA busy_timeout=5000")
+                self._db.executescript(_SCHEMA)
+                self._db.commit()
+            except sqlite3.Error:
+                self._db = None
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def save_plan(self, plan, model_name, city="", parent_id=None, addition=None):
+        """Store a plan and return its id, or None if it was not stored.
+
+        A plan already stored with the same content, model, city and parent
+        (say, one served again from the response cache) keeps its row and id.
+        """
+        if self._db is None or not is_storable(plan):
+            return None
+        packed = _pack(plan)
+        row = (
+            time.time(), model_name, plan.get("theme"), plan.get("activity_type"), canonical_city(city),
+            plan.get("budget_dollars"), _budget_bucket(plan.get("budget_dollars")), plan.get("title"),
+            parent_id, addition, packed,
+        )
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT id FROM plans WHERE theme IS ? AND activity_type IS ? AND model = ? AND city = ?"
+                " AND parent_id IS ? AND addition IS ? AND plan = ? LIMIT 1",
+                (plan.get("theme"), plan.get("activity_type"), model_name, canonical_city(city),
+                 parent_id, addition, packed),
+            ).fetchone()
+            if existing:
+                return existing[0]
+            cursor = self._db.execute(
+                "INSERT INTO plans (created_at, model, theme, activity_type, city, budget_dollars, budget_bucket,"
+                " title, parent_id, addition, plan) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def save_itinerary(self, plan_id, itinerary):
+        if self._db is None or plan_id is None or not is_storable(itinerary):
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO itineraries (plan_id, created_at, itinerary) VALUES (?, ?, ?)",
+                (plan_id, time.time(), _pack(itinerary)),
+            )
+            self._db.commit()
+
+    def recent_plans(self, city=None, max_budget=None, theme=None, activity_type=None, model=None, limit=20):
+        """Newest plans matching every given filter, as summary rows (no plan bodies),
+        e.g. ``recent_plans(city="Austin", max_budget=60)``."""
+        if self._db is None:
+            return []
+        clauses, params = [], []
+        if city:
+            clauses.append("p.city = ?")
+            params.append(canonical_city(city))
+        if max_budget is not None:
+            # The bucket bound lets the (city, budget_bucket) index narrow the range first.
+            clauses.append("p.budget_bucket <= ? AND p.budget_dollars <= ?")
+            params.extend([_budget_bucket(max_budget), max_budget])
+        for column, value in (("theme", theme), ("activity_type", activity_type), ("model", model)):
+            if value:
+                clauses.append(f"p.{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT p.id, p.created_at, p.title, p.theme, p.activity_type, p.city, p.budget_dollars, p.model,"
+            " p.addition, i.plan_id IS NOT NULL"
+            f" FROM plans p LEFT JOIN itineraries i ON i.plan_id = p.id {where}"
+            " ORDER BY p.created_at DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._db.execute(query, (*params, limit)).fetchall()
+        columns = ("id", "created_at", "title", "theme", "activity_type", "city", "budget_dollars", "model",
+                   "addition", "has_itinerary")
+        return [dict(zip(columns, row), has_itinerary=bool(row[-1])) for row in rows]
+
+    def load(self, plan_id):
+        """{"plan", "itinerary", "model"} for a stored plan, or None."""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT p.plan, p.model, i.itinerary FROM plans p LEFT JOIN itineraries i ON i.plan_id = p.id"
+                " WHERE p.id = ?",
+                (plan_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"plan": _unpack(row[0]), "model": row[1], "itinerary": _unpack(row[2]) if row[2] else None}
+
+    def addition_history(self, plan_id):
+        """The additions that led to a plan, oldest first, as (addition, title) pairs."""
+        if self._db is None:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "WITH RECURSIVE chain (id, parent_id, addition, title, depth) AS ("
+                " SELECT id, parent_id, addition, title, 0 FROM plans WHERE id = ?"
+                " UNION ALL SELECT p.id, p.parent_id, p.addition, p.title, chain.depth + 1"
+                " FROM plans p JOIN chain ON p.id = chain.parent_id)"
+                " SELECT addition, title FROM chain WHERE addition IS NOT NULL ORDER BY depth DESC",
+                (plan_id,),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def record_venues(self, city, itinerary):
+        """Remember the venues of an itinerary for city. Newer details replace older ones,
+        but a missing detail never erases a known one. Returns how many were recorded."""
+        city = canonical_city(city)
+        if self._db is None or not city:
+            return 0
+        now = time.time()
+        rows = [(city, canonical_text(name), name, *(fields[field] for field in VENUE_FIELDS), now)
+                for name, fields in extract_venues(itinerary)]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO venues (city, venue_key, name, address, cost_estimate, parking, booking_link, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (city, venue_key) DO UPDATE SET name = excluded.name,"
+                " address = COALESCE(excluded.address, address),"
+                " cost_estimate = COALESCE(excluded.cost_estimate, cost_estimate),"
+                " parking = COALESCE(excluded.parking, parking),"
+                " booking_link = COALESCE(excluded.booking_link, booking_link),"
+                " seen_count = seen_count + 1, last_seen = excluded.last_seen",
+                rows,
+            )
+            self._db.commit()
+        return len(rows)
+
+    def known_venues(self, city, limit=SHORTLIST_SIZE):
+        """The city's most used venues, most used first, as dicts of name and VENUE_FIELDS."""
+        city = canonical_city(city)
+        if self._db is None or not city or limit <= 0:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, address, cost_estimate, parking, booking_link FROM venues"
+                " WHERE city = ? ORDER BY seen_count DESC, last_seen DESC LIMIT ?",
+                (city, limit),
+            ).fetchall()
+        return [dict(zip(("name", *VENUE_FIELDS), row)) for row in rows]
+
+    def venue_stats(self):
+        """Venue and city counts."""
+        if self._db is None:
+            return {"venues": 0, "cities": 0}
+        with self._lock:
+            venues, cities = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT city) FROM venues").fetchone()
+        return {"venues": venues, "cities": cities}
+
+
+plan_store = PlanStore()
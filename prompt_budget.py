@@ -0,0 +1,61 @@
+"""Prompt compaction and input token budgets for the generator flows.
+
+Context embedded in prompts is serialized without indentation and without the
+fields the target flow never reads. Before a call goes out, the gateway
+measures the prompt against the flow's input budget: a local estimate is used
+when it is clearly under or over, and the SDK's ``count_tokens`` only when the
+estimate lands close to the limit, so the common case costs no extra round trip.
+"""
+import json
+
+INPUT_TOKEN_BUDGETS = {"plan": 2000, "addition": 3000, "itinerary": 3000,
+                       "itinerary_skeleton": 3000, "itinerary_section": 3000}
+
+# Plan fields each flow's prompt does not need to see.
+_PREFERENCE_FIELDS = {"theme", "activity_type", "budget_dollars", "prep_time", "time_budget_hours", "planning_style"}
+DROPPED_CONTEXT_FIELDS = {
+    "itinerary": {"model_used", "emoji_story", "planning_style", "incomplete"},
+    # The addition prompt restates the preferences on its own.
+    "addition": {"model_used", "incomplete"} | _PREFERENCE_FIELDS,
+}
+
+# Estimates within this fraction of the budget are confirmed with the SDK.
+EXACT_COUNT_MARGIN = 0.2
+
+
+def compact_json(obj, flow=None):
+    """Minified JSON of obj without the fields the flow does not use."""
+    dropped = DROPPED_CONTEXT_FIELDS.get(flow, set())
+    if isinstance(obj, dict):
+        obj = {key: value for key, value in obj.items() if key not in dropped}
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_prompt(prompt):
+    """Strip the source indentation and blank-line runs out of a prompt."""
+    lines = [line.strip() for line in prompt.strip().splitlines()]
+    compacted = []
+    for line in lines:
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted)
+
+
+def estimate_tokens(text):
+    """Offline token estimate: ~4 ASCII characters per token, one per other character (emoji etc.)."""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def measure_prompt_tokens(model, prompt, budget, timeout=None):
+    """Token count of prompt, using the SDK only when the estimate is near the budget.
+    The SDK call gives up after timeout seconds and the estimate is used instead."""
+    estimate = estimate_tokens(prompt)
+    if budget is None or abs(estimate - budget) > budget * EXACT_COUNT_MARGIN:
+        return estimate
+    try:
+        if timeout is None:
+            return model.count_tokens(prompt).total_tokens
+        return model.count_tokens(prompt, request_options={"timeout": timeout}).total_tokens
+    except Exception:
+        return estimate  # Offline, timed out or count_tokens unsupported
@@ -0,0 +1,203 @@
+"""Admission control for Gemini calls, per API key and model.
+
+Every call takes one request and its estimated tokens from a pair of token
+buckets sized to the provider's per-minute quotas (RPM and TPM) for that key
+and model. Callers wait in a first-come, first-served queue, so sessions
+sharing a key take turns instead of racing each other into 429s, and a
+waiting caller is told its position. A call whose expected wait exceeds the
+maximum is shed straight away rather than left to time out.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from gemini_models import GEMINI_MODELS
+from llm_clients import key_fingerprint
+
+# Free-tier (requests per minute, tokens per minute). Scale them with
+# DATENIGHT_QUOTA_SCALE for paid keys; 0 turns the limiter off.
+MODEL_QUOTAS = {name: (model["rpm"], model["tpm"]) for name, model in GEMINI_MODELS.items()}
+DEFAULT_QUOTA = (int(os.getenv("DATENIGHT_DEFAULT_RPM", 10)), int(os.getenv("DATENIGHT_DEFAULT_TPM", 250_000)))
+QUOTA_SCALE = float(os.getenv("DATENIGHT_QUOTA_SCALE", 1))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("DATENIGHT_MAX_QUEUE_WAIT", 30))
+# Output tokens reserved per call until the real usage is known.
+EXPECTED_OUTPUT_TOKENS = 1000
+# Waiters re-check at least this often so position updates keep flowing.
+QUEUE_POLL_SECONDS = 0.5
+
+
+class QueueFull(Exception):
+    """Raised when a call would wait longer than the allowed maximum."""
+
+    def __init__(self, waiting_ahead, expected_wait):
+        super().__init__(f"{waiting_ahead} requests ahead, about {math.ceil(expected_wait)}s wait")
+        self.waiting_ahead = waiting_ahead
+        self.expected_wait = expected_wait
+
+
+class _Bucket:
+    """Token bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount):
+        # Callers that need more than the whole bucket wait for a full one.
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class _Lane:
+    """Buckets and waiting queue for one (API key, model) pair."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, lock):
+        self.requests = _Bucket(requests_per_minute)
+        self.tokens = _Bucket(tokens_per_minute)
+        self.waiting = deque()
+        self.changed = threading.Condition(lock)
+
+    def expected_wait(self, position, tokens, now):
+        """Seconds until the caller at position (0 = head) could be admitted,
+        assuming everyone ahead needs about as many tokens."""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.seconds_until(position + 1), self.tokens.seconds_until((position + 1) * tokens))
+
+
+class RateLimiter:
+    """Process-wide limiter shared by every session and background job."""
+
+    def __init__(self, quotas=MODEL_QUOTAS, default_quota=DEFAULT_QUOTA, scale=QUOTA_SCALE):
+        self.quotas = quotas
+        self.default_quota = default_quota
+        self.scale = scale
+        self._overrides = {}
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._stats = {"admitted": 0, "queued": 0, "shed": 0, "wait_seconds": 0.0}
+
+    @property
+    def enabled(self):
+        return self.scale > 0
+
+    def _lane(self, api_key, model_name):
+        # Caller holds the lock.
+        lane_key = (key_fingerprint(api_key), model_name)
+        lane = self._lanes.get(lane_key)
+        if lane is None:
+            if model_name in self._overrides:
+                rpm, tpm = self._overrides[model_name]
+            else:
+                rpm, tpm = self.quotas.get(model_name, self.default_quota)
+                rpm, tpm = rpm * self.scale, tpm * self.scale
+            lane = self._lanes[lane_key] = _Lane(max(1, rpm), max(1, tpm), self._lock)
+        return lane
+
+    def set_quota(self, model_name, requests_per_minute, tokens_per_minute=None):
+        """Size this model's lanes to an explicit quota, as given on a command line,
+        instead of the scaled free-tier one. Call before any request is queued."""
+        with self._lock:
+            if tokens_per_minute is None:
+                tokens_per_minute = self.quotas.get(model_name, self.default_quota)[1] * self.scale
+            self._overrides[model_name] = (requests_per_minute, tokens_per_minute)
+            for lane_key in [lane_key for lane_key in self._lanes if lane_key[1] == model_name]:
+                del self._lanes[lane_key]
+
+    def acquire(self, api_key, model_name, tokens, on_queue=None, max_wait=MAX_QUEUE_WAIT_SECONDS, cancel=None):
+        """Block until the call may go out and return the tokens reserved for it.
+
+        While the caller waits, on_queue(position, seconds) is called whenever
+        its position (1 = next in line) or expected wait changes, and
+        on_queue(0, 0) once it is admitted. Raises QueueFull if the wait would
+        exceed max_wait. If the cancel event is set while waiting, the caller
+        leaves the queue at once and None is returned; nothing is taken.
+        """
+        if not self.enabled:
+            return 0
+        started = time.monotonic()
+        ticket = object()
+        reported = None
+        with self._lock:
+            lane = self._lane(api_key, model_name)
+            lane.waiting.append(ticket)
+        try:
+            while True:
+                with self._lock:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    now = time.monotonic()
+                    position = lane.waiting.index(ticket)
+                    wait = lane.expected_wait(position, tokens, now)
+                    if position == 0 and wait == 0:
+                        lane.requests.level -= 1
+                        lane.tokens.level -= tokens
+                        self._stats["admitted"] += 1
+                        self._stats["queued"] += reported is not None
+                        self._stats["wait_seconds"] += now - started
+                        break
+                    if now - started + wait > max_wait:
+                        self._stats["shed"] += 1
+                        raise QueueFull(position, wait)
+                    if reported is None or reported != (position + 1, math.ceil(wait)):
+                        update = reported = (position + 1, math.ceil(wait))
+                    else:
+                        update = None
+                        lane.changed.wait(timeout=min(max(wait, 0.01), QUEUE_POLL_SECONDS))
+                if update and on_queue:
+                    on_queue(*update)
+        finally:
+            with self._lock:
+                lane.waiting.remove(ticket)
+                lane.changed.notify_all()
+        if reported is not None and on_queue:
+            on_queue(0, 0)
+        return tokens
+
+    def headroom(self, api_key, model_name):
+        """How many more calls this key and model could send right now without queueing,
+        or None when the limiter is off."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            lane = self._lane(api_key, model_name)
+            lane.requests.refill(time.monotonic())
+            return max(0, math.floor(lane.requests.level) - len(lane.waiting))
+
+    def settle(self, api_key, model_name, reserved, used):
+        """Correct a reservation once the call's real token usage is known."""
+        if not self.enabled or used is None:
+            return
+        with self._lock:
+            self._lane(api_key, model_name).tokens.level -= used - reserved
+
+    def exhausted(self, api_key, model_name):
+        """The provider rate limited this key and model: hold new calls until the bucket refills."""
+        if not self.enabled:
+            return
+        with self._lock:
+            lane = self._lane(api_key, model_name)
+            lane.requests.refill(time.monotonic())
+            lane.requests.level = min(lane.requests.level, 0.0)
+
+    def stats(self):
+        with self._lock:
+            admitted = self._stats["admitted"]
+            return {
+                "admitted": admitted,
+                "queued": self._stats["queued"],
+                "shed": self._stats["shed"],
+                "waiting": sum(len(lane.waiting) for lane in self._lanes.values()),
+                "avg_wait_s": round(self._stats["wait_seconds"] / admitted, 3) if admitted else None,
+            }
+
+
+rate_limiter = RateLimiter()
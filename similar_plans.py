@@ -0,0 +1,216 @@
+"""Near-duplicate lookup over earlier plan requests.
+
+Exact cache keys miss requests that differ only cosmetically: "loves mexican
+food" vs "Loves Mexican food!", a $49 vs $50 budget, "NYC" vs "New York". This
+index groups earlier plan requests by model, categorical preferences and
+canonical location line, accepts budgets within a tolerance, and scores the
+free-text suggestions by cosine similarity of hashed character trigrams.
+Each group keeps an inverted index from trigram bucket to flat ``array``
+postings of (entry id, weight), so a lookup only touches entries that share a
+trigram with the query and stays well under a millisecond. It can run before
+every generation without a network call.
+"""
+import copy
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+SIMILAR_MAX_ENTRIES = int(os.getenv("DATENIGHT_SIMILAR_MAX_ENTRIES", 2000))
+# Only the most recent requests per preference group are kept, which bounds lookup cost.
+GROUP_MAX_ENTRIES = 64
+DEFAULT_THRESHOLD = 0.85
+NGRAM_SIZE = 3
+HASH_BUCKETS = 1 << 20
+# Budgets within 10% (and at least $5) of each other count as the same request.
+BUDGET_TOLERANCE = 0.10
+BUDGET_TOLERANCE_MIN_DOLLARS = 5
+
+# Common nicknames for cities, mapped to the name the index compares on.
+CITY_ALIASES = {
+    "nyc": "new york",
+    "new york city": "new york",
+    "new york ny": "new york",
+    "manhattan": "new york",
+    "la": "los angeles",
+    "los angeles ca": "los angeles",
+    "sf": "san francisco",
+    "san fran": "san francisco",
+    "san francisco ca": "san francisco",
+    "dc": "washington",
+    "washington dc": "washington",
+    "philly": "philadelphia",
+    "vegas": "las vegas",
+    "nola": "new orleans",
+    "atx": "austin",
+    "austin tx": "austin",
+    "chi town": "chicago",
+    "chicago il": "chicago",
+    "slc": "salt lake city",
+    "kc": "kansas city",
+}
+_ALIAS_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(alias) for alias in sorted(CITY_ALIASES, key=len, reverse=True)) + r")\b"
+)
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def canonical_text(text):
+    """Casefolded text with punctuation dropped and whitespace collapsed."""
+    return " ".join(_NON_WORD.sub(" ", (text or "").casefold()).split())
+
+
+def canonical_city(text):
+    """canonical_text with city nicknames replaced by the name they stand for."""
+    return _ALIAS_PATTERN.sub(lambda match: CITY_ALIASES[match.group(1)], canonical_text(text))
+
+
+def text_vector(text):
+    """Sparse L2-normalized hashed trigram vector as (bucket ids, weights) arrays."""
+    text = canonical_text(text)
+    counts = {}
+    if text:
+        padded = f" {text} "
+        for start in range(len(padded) - NGRAM_SIZE + 1):
+            bucket = zlib.crc32(padded[start:start + NGRAM_SIZE].encode("utf-8")) % HASH_BUCKETS
+            counts[bucket] = counts.get(bucket, 0) + 1
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    buckets = sorted(counts)
+    return array("I", buckets), array("f", (counts[bucket] / norm for bucket in buckets))
+
+
+def _group_key(model_name, fields):
+    return (
+        model_name,
+        canonical_text(fields.get("theme")),
+        canonical_text(fields.get("activity_type")),
+        canonical_text(fields.get("prep_time_text")),
+        fields.get("time_budget_hours"),
+        canonical_text(fields.get("planning_style_prompt_line")),
+        canonical_city(fields.get("location_prompt_line")),
+    )
+
+
+def _budget_matches(requested, stored):
+    try:
+        requested, stored = float(requested), float(stored)
+    except (TypeError, ValueError):
+        return requested == stored
+    return abs(requested - stored) <= max(BUDGET_TOLERANCE_MIN_DOLLARS, BUDGET_TOLERANCE * max(requested, stored))
+
+
+class _Group:
+    """Entries sharing one group key, with an inverted index over their trigram buckets."""
+
+    def __init__(self):
+        self.budgets = {}  # entry id -> budget
+        self.empty_text = set()  # entry ids whose request had no suggestions
+        self.postings = {}  # bucket -> (array of entry ids, array of weights)
+
+    def add(self, entry_id, budget, buckets, weights):
+        self.budgets[entry_id] = budget
+        if not buckets:
+            self.empty_text.add(entry_id)
+        for bucket, weight in zip(buckets, weights):
+            ids, bucket_weights = self.postings.setdefault(bucket, (array("Q"), array("f")))
+            ids.append(entry_id)
+            bucket_weights.append(weight)
+
+    def remove(self, entry_id, buckets):
+        del self.budgets[entry_id]
+        self.empty_text.discard(entry_id)
+        for bucket in buckets:
+            ids, bucket_weights = self.postings[bucket]
+            position = ids.index(entry_id)
+            del ids[position]
+            del bucket_weights[position]
+            if not ids:
+                del self.postings[bucket]
+
+    def scores(self, buckets, weights):
+        """Cosine similarity of the query to every entry sharing at least one trigram."""
+        if not buckets:
+            return {entry_id: 1.0 for entry_id in self.empty_text}
+        scores = {}
+        for bucket, query_weight in zip(buckets, weights):
+            posting = self.postings.get(bucket)
+            if posting is None:
+                continue
+            for entry_id, weight in zip(*posting):
+                scores[entry_id] = scores.get(entry_id, 0.0) + query_weight * weight
+        return scores
+
+
+class SimilarPlanIndex:
+    """Bounded, thread-safe index of earlier plans keyed by their request fields.
+
+    ``fields`` are the plan generator's arguments: theme, activity_type,
+    budget_dollars, prep_time_text, user_input, time_budget_hours,
+    planning_style_prompt_line and location_prompt_line.
+    """
+
+    def __init__(self, max_entries=SIMILAR_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry id -> (group key, trigram buckets, plan)
+        self._groups = {}  # group key -> _Group
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "lookup_seconds": 0.0}
+
+    def add(self, model_name, fields, plan):
+        group = _group_key(model_name, fields)
+        buckets, weights = text_vector(fields.get("user_input"))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (group, buckets, copy.deepcopy(plan))
+            self._groups.setdefault(group, _Group()).add(entry_id, fields.get("budget_dollars"), buckets, weights)
+            if len(self._groups[group].budgets) > GROUP_MAX_ENTRIES:
+                self._evict(next(iter(self._groups[group].budgets)))
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, entry_id):
+        # Caller holds the lock.
+        group, buckets, _plan = self._entries.pop(entry_id)
+        self._groups[group].remove(entry_id, buckets)
+        if not self._groups[group].budgets:
+            del self._groups[group]
+
+    def find(self, model_name, fields, threshold=DEFAULT_THRESHOLD):
+        """(plan, score) of the most similar earlier request scoring at least threshold, or None."""
+        started = time.perf_counter()
+        group = _group_key(model_name, fields)
+        buckets, weights = text_vector(fields.get("user_input"))
+        best_score, best_plan = None, None
+        with self._lock:
+            entries = self._groups.get(group)
+            scores = entries.scores(buckets, weights) if entries else {}
+            for entry_id, score in scores.items():
+                if score < threshold or (best_score is not None and score <= best_score):
+                    continue
+                if _budget_matches(fields.get("budget_dollars"), entries.budgets[entry_id]):
+                    best_score, best_plan = score, self._entries[entry_id][2]
+            self._stats["lookups"] += 1
+            self._stats["hits"] += best_plan is not None
+            self._stats["lookup_seconds"] += time.perf_counter() - started
+            if best_plan is None:
+                return None
+            return copy.deepcopy(best_plan), round(best_score, 3)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                "entries": len(self._entries),
+                "lookups": lookups,
+                "hits": self._stats["hits"],
+                "avg_lookup_ms": round(1000 * self._stats["lookup_seconds"] / lookups, 3) if lookups else None,
+            }
+
+
+similar_plan_index = SimilarPlanIndex()
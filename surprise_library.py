@@ -0,0 +1,216 @@
+"""Pre-generated plans and itineraries for the Surprise Me examples.
+
+Surprise Me always picks from the fixed examples in
+data/example_date_plans.json, so the plan and itinerary for every
+(example, model) pair can be generated ahead of time and served instantly. The library is a JSON file loaded lazily on first use
+and keyed by a hash of the example's fields, so editing an example simply
+makes its entry miss. An entry older than the max age is still served, and
+the app then regenerates that one entry on a background thread with the
+user's key. Rebuilding the whole library is left to the offline command.
+
+Build or refresh the library offline with:
+
+    python surprise_library.py --models gemini-2.0-flash,gemini-2.5-flash-preview-04-17
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+if __name__ == "__main__":
+    # Before the app modules below read their DATENIGHT_* settings at import.
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from date_planner import (
+    generate_date_plan_with_gemini, generate_detailed_itinerary,
+    location_prompt_line_for, planning_style_prompt_line_for,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Set DATENIGHT_SURPRISE_LIBRARY to an empty string to disable the library.
+LIBRARY_PATH = os.getenv("DATENIGHT_SURPRISE_LIBRARY", os.path.join(DATA_DIR, "surprise_library.json"))
+MAX_AGE_SECONDS = float(os.getenv("DATENIGHT_SURPRISE_MAX_AGE", 7 * 24 * 3600))
+# A stale entry is refreshed at most once per interval per process.
+REFRESH_INTERVAL_SECONDS = 3600
+# The Surprise Me examples ship as data, read the first time Surprise Me is used.
+EXAMPLES_PATH = os.path.join(DATA_DIR, "example_date_plans.json")
+
+
+@functools.lru_cache(maxsize=None)
+def example_date_plans():
+    """The Surprise Me examples, loaded from EXAMPLES_PATH on first use."""
+    with open(EXAMPLES_PATH, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def example_key(example):
+    """Stable identifier of an example's fields."""
+    payload = json.dumps(example, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _entry_key(example, model_name):
+    return f"{example_key(example)}|{model_name}"
+
+
+def _is_usable(result):
+    return isinstance(result, dict) and "error" not in result and not result.get("incomplete")
+
+
+class SurpriseLibrary:
+    """Lazily loaded JSON store of plan + itinerary per (example, model)."""
+
+    def __init__(self, path=LIBRARY_PATH, max_age=MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self._entries = None
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._last_refresh = {}
+
+    def _load(self):
+        # Caller holds the lock.
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as handle:
+                    self._entries = json.load(handle).get("entries", {})
+            except (OSError, ValueError):
+                pass  # A corrupt library behaves like an empty one and is rebuilt on the next store
+        return self._entries
+
+    def _save(self):
+        # Caller holds the lock. Write to a temp file and swap so readers never see half a file.
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"version": 1, "entries": self._entries}, handle, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, example, model_name):
+        """The stored entry for example and model, or None."""
+        if not example or not model_name:
+            return None
+        with self._lock:
+            entry = self._load().get(_entry_key(example, model_name))
+        return dict(entry) if entry else None
+
+    def is_stale(self, entry):
+        return entry is None or time.time() - entry.get("built_at", 0) > self.max_age
+
+    def store(self, example, model_name, plan, itinerary):
+        entry = {"example": example, "model": model_name, "plan": plan, "itinerary": itinerary,
+                 "built_at": round(time.time(), 3)}
+        with self._lock:
+            self._load()[_entry_key(example, model_name)] = entry
+            self._save()
+        return entry
+
+    def stale_examples(self, model_name, examples=None):
+        with self._lock:
+            entries = self._load()
+            return [example for example in (examples or example_date_plans())
+                    if self.is_stale(entries.get(_entry_key(example, model_name)))]
+
+    def rebuild(self, api_key, model_name, example):
+        """Generate and store the plan and itinerary for one example. Returns the entry, or None on failure."""
+        planning_style_prompt_line = planning_style_prompt_line_for(example["planning_style"])
+        location_prompt_line = location_prompt_line_for(example["include_location"], example["city"])
+        plan = generate_date_plan_with_gemini(
+            api_key, model_name,
+            example["theme"], example["activity"],
+            example["budget"], example["prep_time"], example["custom_input"],
+            example["duration"],
+            planning_style_prompt_line,
+            location_prompt_line,
+            use_cache=False,
+        )
+        if not _is_usable(plan):
+            return None
+        itinerary = generate_detailed_itinerary(
+            api_key, model_name, plan,
+            original_user_input=example["custom_input"],
+            location_prompt_line=location_prompt_line,
+            planning_style_prompt_line=planning_style_prompt_line,
+            city=example["city"] if example["include_location"] else "",
+            use_cache=False,
+        )
+        return self.store(example, model_name, plan, itinerary if _is_usable(itinerary) else None)
+
+    def refresh_in_background(self, api_key, model_name, example):
+        """Regenerate the entry for one example and model on a daemon thread.
+
+        Only the entry that was just served is refreshed: the calls run on the
+        user's own key and rate limiter lane, so they must stay about as small
+        as the request the user made.
+        """
+        if not self.path or not api_key or not model_name or not example:
+            return False
+        entry_key = _entry_key(example, model_name)
+        with self._lock:
+            recently = time.monotonic() - self._last_refresh.get(entry_key, float("-inf")) < REFRESH_INTERVAL_SECONDS
+            if entry_key in self._refreshing or recently:
+                return False
+            self._refreshing.add(entry_key)
+            self._last_refresh[entry_key] = time.monotonic()
+
+        def refresh():
+            try:
+                self.rebuild(api_key, model_name, example)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(entry_key)
+
+        threading.Thread(target=refresh, name=f"surprise-refresh-{entry_key}", daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._load().values())
+        return {
+            "entries": len(entries),
+            "stale": sum(1 for entry in entries if self.is_stale(entry)),
+            "refreshing": sorted(self._refreshing),
+        }
+
+
+surprise_library = SurpriseLibrary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate Surprise Me plans and itineraries.")
+    parser.add_argument("--models", required=True, help="Comma-separated model names")
+    parser.add_argument("--all", action="store_true", help="Rebuild every entry, not only missing or stale ones")
+    parser.add_argument("--api-key", default=None, help="Defaults to GOOGLE_API_KEY")
+    args = parser.parse_args(argv)
+    api_key = args.api_key or os.getenv("GOOGLE_API_KEY", "")
+    if not api_key:
+        print("No API key: pass --api-key or set GOOGLE_API_KEY.", file=sys.stderr)
+        return 2
+    if not surprise_library.path:
+        print("DATENIGHT_SURPRISE_LIBRARY is empty; nothing to build.", file=sys.stderr)
+        return 2
+
+    failures = 0
+    for model_name in (name.strip() for name in args.models.split(",") if name.strip()):
+        examples = example_date_plans() if args.all else surprise_library.stale_examples(model_name)
+        print(f"{model_name}: {len(examples)} of {len(example_date_plans())} examples to build", file=sys.stderr)
+        for index, example in enumerate(examples, start=1):
+            entry = surprise_library.rebuild(api_key, model_name, example)
+            failures += entry is None
+            status = "ok" if entry else "error"
+            print(f"[{index}/{len(examples)}] {status:5} {example['theme']} | {example['activity']}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""The app's stylesheet, served as a static asset.
+
+static/theme.css is served through Streamlit's static file serving (enabled
+in .streamlit/config.toml), so each rerun sends only a <link> tag whose URL
+carries a hash of the file. The browser downloads the stylesheet once and
+keeps it until the content changes. With static serving turned off the
+stylesheet is inlined instead.
+"""
+import functools
+import hashlib
+import os
+
+import streamlit as st
+
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "theme.css")
+STATIC_URL_PREFIX = "app/static/"
+
+
+@functools.lru_cache(maxsize=8)
+def _stylesheet_html(static_serving, modified_at):
+    with open(STYLESHEET_PATH, encoding="utf-8") as handle:
+        css = handle.read()
+    if not static_serving:
+        return f"<style>{css}</style>"
+    digest = hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+    return f"<link rel='stylesheet' href='{STATIC_URL_PREFIX}{os.path.basename(STYLESHEET_PATH)}?v={digest}'>"
+
+
+def theme_stylesheet_html():
+    """Markup that applies the theme: a content-hashed <link>, or an inline <style> fallback."""
+    return _stylesheet_html(bool(st.get_option("server.enableStaticServing")), os.path.getmtime(STYLESHEET_PATH))
@@ -0,0 +1,74 @@
+"""Per-city knowledge of the real venues named in generated itineraries.
+
+Every complete itinerary teaches the app a few venues: the timeline item's
+location together with its address, cost estimate, parking and booking link.
+The plan store keeps them in its venues table, keyed by canonical city and
+venue name. The next itinerary for that city gets a compact shortlist of them
+in its prompt, and the model may leave out the details of any venue it picks
+from the list; they are filled back in afterwards. Popular cities get more
+consistent venues and shorter responses.
+"""
+import os
+
+from similar_plans import canonical_text
+
+SHORTLIST_SIZE = int(os.getenv("DATENIGHT_VENUE_SHORTLIST", 12))
+# Timeline fields remembered per venue. All but cost_estimate are optional in the
+# itinerary schema, so the model can leave them out for a known venue.
+VENUE_FIELDS = ("address", "cost_estimate", "parking", "booking_link")
+FILLED_FIELDS = ("address", "parking", "booking_link")
+# Values that say nothing about the venue.
+_EMPTY_VALUES = {"", "n/a", "na", "none", "not applicable", "not required", "unknown", "tbd"}
+
+
+def _clean(value):
+    if not isinstance(value, str):
+        return None
+    value = " ".join(value.split())
+    return None if value.casefold() in _EMPTY_VALUES else value
+
+
+def extract_venues(itinerary):
+    """(name, {field: value}) for each timeline item that names a real place, i.e. has an address."""
+    venues = []
+    for item in (itinerary or {}).get("timeline") or []:
+        if not isinstance(item, dict):
+            continue
+        name = _clean(item.get("location"))
+        fields = {field: _clean(item.get(field)) for field in VENUE_FIELDS}
+        if name and canonical_text(name) and fields["address"]:
+            venues.append((name, fields))
+    return venues
+
+
+def venue_details(venue):
+    return "; ".join(venue[field] for field in VENUE_FIELDS if venue.get(field))
+
+
+def venue_prompt_line(city, venues, omit_known_details=True):
+    """Prompt lines offering the known venues to the model, or "" when there are none."""
+    if not venues:
+        return ""
+    lines = [f"Venues already known near {city} (prefer them when they fit the date; new places are fine too):"]
+    lines.extend(f"- {venue['name']}: {venue_details(venue)}" for venue in venues)
+    if omit_known_details:
+        lines.append("For a venue taken from this list, leave out address, parking and booking_link; they are filled in from the list.")
+    return "\n".join(lines)
+
+
+def find_venue(venues, name):
+    """The known venue called name, or None."""
+    key = canonical_text(name if isinstance(name, str) else "")
+    return next((venue for venue in venues if canonical_text(venue["name"]) == key), None) if key else None
+
+
+def fill_known_venues(itinerary, venues):
+    """Copy the cached details of known venues into timeline items that left them out."""
+    for item in (itinerary or {}).get("timeline") or []:
+        venue = find_venue(venues, item.get("location")) if isinstance(item, dict) else None
+        if venue is None:
+            continue
+        for field in FILLED_FIELDS:
+            if not _clean(item.get(field)) and venue.get(field):
+                item[field] = venue[field]
+    return itinerary